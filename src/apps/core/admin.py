@@ -1,12 +1,20 @@
 from django.contrib import admin
-from .models import Product, Customer, Order, OrderItem, Expense
+from django.utils.html import format_html
+from . import rollups
+from .models import Product, Customer, CustomerStats, Order, OrderItem, Expense
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'sku', 'unit_price', 'cost_price', 'profit_margin', 'availability_status', 'sold']
+    list_display = ['name', 'thumbnail', 'sku', 'unit_price', 'cost_price', 'profit_margin', 'availability_status', 'sold']
     search_fields = ['name', 'sku']
     list_filter = ['sold']
     
+    @admin.display(description='')
+    def thumbnail(self, obj):
+        if not obj.image:
+            return ''
+        return format_html('<img src="{}" alt="" width="48" loading="lazy">', obj.thumbnail_url('small'))
+    
     def availability_status(self, obj):
         return obj.availability_status
     availability_status.short_description = 'Status'
@@ -22,10 +30,29 @@ class ExpenseInline(admin.TabularInline):
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
     list_display = ['first_name', 'last_name', 'phone', 'total_ties_bought', 'total_amount_paid']
+    list_select_related = ['stats']
     search_fields = ['first_name', 'last_name', 'phone']
     fieldsets = (
         ('Customer Info', {'fields': ('first_name', 'last_name', 'email', 'phone', 'address')}),
     )
+    
+    @admin.display(description='Total ties bought', ordering='stats__ties_bought')
+    def total_ties_bought(self, obj):
+        return obj.total_ties_bought()
+    
+    @admin.display(description='Total amount paid', ordering='stats__lifetime_value')
+    def total_amount_paid(self, obj):
+        return obj.total_amount_paid()
+
+@admin.register(CustomerStats)
+class CustomerStatsAdmin(admin.ModelAdmin):
+    list_display = ['customer', 'order_count', 'ties_bought', 'lifetime_value', 'first_order_at', 'updated_at']
+    list_select_related = ['customer']
+    search_fields = ['customer__first_name', 'customer__last_name', 'customer__phone']
+    readonly_fields = ['customer'] + CustomerStats.STAT_FIELDS + ['updated_at']
+    
+    def has_add_permission(self, request):
+        return False
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
@@ -35,17 +62,18 @@ class OrderAdmin(admin.ModelAdmin):
     inlines = [OrderItemInline, ExpenseInline]
     fieldsets = (
         ('Order Info', {'fields': ('order_number', 'customer', 'status', 'number_of_ties', 'cost_price_per_tie')}),
-        ('Amounts', {'fields': ('total_amount', 'total_cost', 'gross_profit')}),
+        ('Amounts', {'fields': ('total_amount', 'total_cost', 'gross_profit', 'net_profit')}),
         ('Delivery', {'fields': ('delivery_fee', 'delivery_payment_type', 'customer_delivery_amount', 'business_delivery_amount', 'packaging_boxes')}),
         ('Dates', {'fields': ('created_at', 'updated_at')}),
     )
     
-    readonly_fields = ('updated_at',)
+    # Derived from the amounts and delivery split on every save
+    readonly_fields = ('gross_profit', 'net_profit', 'updated_at')
     
     def save_model(self, request, obj, form, change):
         super().save_model(request, obj, form, change)
-        obj.calculate_total()
-        obj.save()
+        # Recalculated from the items once the inlines are saved and the change commits
+        rollups.schedule('order_totals', {obj.pk})
 
 @admin.register(Expense)
 class ExpenseAdmin(admin.ModelAdmin):
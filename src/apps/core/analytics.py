@@ -0,0 +1,179 @@
+"""
+Revenue and profit time series by day, week or month.
+
+Orders are grouped on ``created_at`` and expenses on ``date`` in SQL, with
+TruncDay/TruncWeek/TruncMonth in the current time zone. A period is "closed"
+once it is over, and closed periods are cached without a timeout, so a
+year-long chart only queries the current period. Ranges are widened to whole
+periods, so every bucket always covers the same days whatever range was asked
+for and can be reused by any later chart.
+
+Closed buckets are stored together per chunk (a month of days, a year of
+weeks or months) to keep the number of cache entries small. Writes dated in a
+closed period queue those days for the ``analytics`` rollup job, which drops
+the chunks containing them once the transaction commits.
+
+Every invalidation also bumps a generation counter. A request that computed
+chunks checks the counter again after caching them and drops them if it
+moved, so a write that lands while a chunk is being computed can't leave the
+stale chunk cached for good.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from . import reports
+
+KEY_PREFIX = 'analytics:'
+GENERATION_KEY = f'{KEY_PREFIX}generation'
+
+GRANULARITIES = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+
+# Default span of a chart when no start date is given, in days
+DEFAULT_SPANS = {'day': 30, 'week': 7 * 12, 'month': 365}
+
+MAX_BUCKETS = 1000
+
+ORDER_TOTALS = {
+    'order_count': Count('id'),
+    'ties_sold': Sum('number_of_ties'),
+    'revenue': Sum('total_amount'),
+    'cost': Sum('total_cost'),
+    'gross_profit': Sum('gross_profit'),
+    'order_profit': Sum('net_profit'),
+    'delivery_fees': Sum('delivery_fee'),
+    'customer_delivery': Sum('customer_delivery_amount'),
+    'business_delivery': Sum('business_delivery_amount'),
+}
+EXPENSE_TOTALS = {
+    'expenses': Sum('amount'),
+    'packaging_expenses': Sum('amount', filter=Q(expense_type='packaging')),
+}
+COUNT_FIELDS = ('order_count', 'ties_sold')
+FIELDS = [*ORDER_TOTALS, *EXPENSE_TOTALS, 'net_profit']
+
+
+def period_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_period(start, granularity):
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    if granularity == 'month':
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def _chunk_key(period, granularity):
+    chunk = period.replace(day=1) if granularity == 'day' else date(period.year, 1, 1)
+    return f'{KEY_PREFIX}{granularity}:{chunk.isoformat()}'
+
+
+def _empty():
+    return {field: 0 if field in COUNT_FIELDS else Decimal('0') for field in FIELDS}
+
+
+def compute(granularity, first, last):
+    """Totals per period for the periods starting from ``first`` to ``last``; periods without data are left out."""
+    trunc = GRANULARITIES[granularity]
+    tz = timezone.get_current_timezone()
+    end = next_period(last, granularity) - timedelta(days=1)
+    periods = {}
+
+    orders = (
+        reports.filtered_orders(first, end)
+        .annotate(period=trunc('created_at', tzinfo=tz))
+        .values('period')
+        .annotate(**ORDER_TOTALS)
+        .order_by()
+    )
+    for row in orders:
+        periods.setdefault(timezone.localtime(row.pop('period')).date(), _empty()).update(
+            {field: value or 0 for field, value in row.items()}
+        )
+    expenses = (
+        reports.filtered_expenses(first, end)
+        .annotate(period=trunc('date', tzinfo=tz))
+        .values('period')
+        .annotate(**EXPENSE_TOTALS)
+        .order_by()
+    )
+    for row in expenses:
+        periods.setdefault(timezone.localtime(row.pop('period')).date(), _empty()).update(
+            {field: value or 0 for field, value in row.items()}
+        )
+
+    for totals in periods.values():
+        # The same definition as the financial report's net profit
+        totals['net_profit'] = totals['revenue'] - (
+            totals['expenses'] + totals['business_delivery'] + totals['packaging_expenses']
+        )
+    return periods
+
+
+def series(granularity, start, end, today=None):
+    """
+    One row of totals per period covering ``start`` to ``end`` (inclusive days,
+    widened to whole periods), oldest first. Raises ValueError for an unknown
+    granularity or an invalid range.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    if start > end:
+        raise ValueError('start must not be after end')
+    periods = [period_start(start, granularity)]
+    while periods[-1] < period_start(end, granularity):
+        periods.append(next_period(periods[-1], granularity))
+        if len(periods) > MAX_BUCKETS:
+            raise ValueError(f'At most {MAX_BUCKETS} periods per request')
+
+    open_period = period_start(today or timezone.localdate(), granularity)
+    keys = {_chunk_key(period, granularity) for period in periods if period < open_period}
+    chunks = cache.get_many([*keys, GENERATION_KEY])
+    generation = chunks.pop(GENERATION_KEY, None)
+    values = {}
+    for period in periods:
+        if period < open_period and period in chunks.get(_chunk_key(period, granularity), {}):
+            values[period] = chunks[_chunk_key(period, granularity)][period]
+
+    missing = [period for period in periods if period not in values]
+    if missing:
+        computed = compute(granularity, missing[0], missing[-1])
+        changed = set()
+        for period in missing:
+            values[period] = computed.get(period) or _empty()
+            if period < open_period:
+                key = _chunk_key(period, granularity)
+                chunks.setdefault(key, {})[period] = values[period]
+                changed.add(key)
+        if changed:
+            cache.set_many({key: chunks[key] for key in changed}, timeout=None)
+            # invalidate() bumps the generation before deleting, so a bump we
+            # don't see here comes with a delete that runs after our write
+            if cache.get(GENERATION_KEY) != generation:
+                cache.delete_many(changed)
+
+    return [{'period': period, **values[period]} for period in periods]
+
+
+def invalidate(days):
+    """Drop the cached periods containing ``days`` at every granularity."""
+    keys = {
+        _chunk_key(period_start(day, granularity), granularity)
+        for day in days for granularity in GRANULARITIES
+    }
+    if keys:
+        try:
+            cache.incr(GENERATION_KEY)
+        except ValueError:
+            cache.set(GENERATION_KEY, 1, timeout=None)
+        cache.delete_many(keys)
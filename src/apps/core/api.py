@@ -0,0 +1,151 @@
+"""
+Read-only JSON API over orders, customers and expenses.
+
+Every list is served from a single ``values(...)`` query: only the requested
+columns are selected, and related fields such as ``customer_phone`` are
+joined in the same query, so a page costs one query however many rows or
+fields it has. Lists are newest first and paginated by keyset cursor. With
+``ids=1,2,3`` the given rows are fetched in one query instead of one request
+each.
+"""
+from . import reports
+from .models import Customer
+from .pagination import KeysetPaginator
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+def _integer(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be an integer')
+
+
+def _orders(params):
+    orders = reports.filtered_orders(
+        start=reports.parse_date(params.get('start')),
+        end=reports.parse_date(params.get('end')),
+        status=params.get('status') or None,
+        delivery_type=params.get('delivery_type') or None,
+    )
+    if params.get('customer'):
+        orders = orders.filter(customer_id=_integer(params['customer'], 'customer'))
+    return orders
+
+
+def _customers(params):
+    customers = Customer.objects.all()
+    if params.get('phone'):
+        customers = customers.filter(phone=params['phone'])
+    return customers
+
+
+def _expenses(params):
+    expenses = reports.filtered_expenses(
+        start=reports.parse_date(params.get('start')),
+        end=reports.parse_date(params.get('end')),
+        expense_type=params.get('expense_type') or None,
+    )
+    if params.get('order'):
+        expenses = expenses.filter(order_id=_integer(params['order'], 'order'))
+    if params.get('customer'):
+        expenses = expenses.filter(order__customer_id=_integer(params['customer'], 'customer'))
+    return expenses
+
+
+# name -> (filtered queryset, keyset fields, {API field: ORM path})
+RESOURCES = {
+    'orders': (_orders, ('created_at', 'id'), {
+        'id': 'id',
+        'order_number': 'order_number',
+        'status': 'status',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+        'customer': 'customer_id',
+        'customer_first_name': 'customer__first_name',
+        'customer_last_name': 'customer__last_name',
+        'customer_phone': 'customer__phone',
+        'number_of_ties': 'number_of_ties',
+        'cost_price_per_tie': 'cost_price_per_tie',
+        'total_amount': 'total_amount',
+        'total_cost': 'total_cost',
+        'gross_profit': 'gross_profit',
+        'net_profit': 'net_profit',
+        'delivery_fee': 'delivery_fee',
+        'delivery_payment_type': 'delivery_payment_type',
+        'customer_delivery_amount': 'customer_delivery_amount',
+        'business_delivery_amount': 'business_delivery_amount',
+        'packaging_boxes': 'packaging_boxes',
+    }),
+    'customers': (_customers, ('id',), {
+        'id': 'id',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'email': 'email',
+        'phone': 'phone',
+        'address': 'address',
+        'order_count': 'stats__order_count',
+        'ties_bought': 'stats__ties_bought',
+        'lifetime_value': 'stats__lifetime_value',
+        'first_order_at': 'stats__first_order_at',
+        'latest_order_at': 'stats__latest_order_at',
+    }),
+    'expenses': (_expenses, ('date', 'id'), {
+        'id': 'id',
+        'description': 'description',
+        'amount': 'amount',
+        'expense_type': 'expense_type',
+        'date': 'date',
+        'order': 'order_id',
+        'order_number': 'order__order_number',
+    }),
+}
+
+
+def _selected_fields(params, available):
+    if not params.get('fields'):
+        return list(available)
+    fields = [field.strip() for field in params['fields'].split(',') if field.strip()]
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(available)}")
+    return list(dict.fromkeys(fields))
+
+
+def _ids(value):
+    ids = [_integer(part, 'ids') for part in value.split(',') if part.strip()]
+    if len(ids) > MAX_LIMIT:
+        raise ValueError(f'At most {MAX_LIMIT} ids per request')
+    return ids
+
+
+def fetch(resource, params):
+    """
+    The JSON body for ``resource`` (a key of RESOURCES) with the query
+    parameters ``params``. Raises ValueError for invalid parameters.
+    """
+    build_queryset, key_fields, available = RESOURCES[resource]
+    fields = _selected_fields(params, available)
+    queryset = build_queryset(params)
+
+    # The keyset columns are always selected too, so the cursor can be built from each row
+    rows = queryset.values(*dict.fromkeys([*(available[field] for field in fields), *key_fields]))
+
+    def public(row):
+        return {field: row[available[field]] for field in fields}
+
+    if params.get('ids'):
+        ids = _ids(params['ids'])
+        by_id = {row['id']: row for row in rows.filter(pk__in=ids)}
+        # In the order asked for; ids that don't exist are left out
+        return {'results': [public(by_id[pk]) for pk in dict.fromkeys(ids) if pk in by_id]}
+
+    limit = min(max(_integer(params.get('limit', DEFAULT_LIMIT), 'limit'), 1), MAX_LIMIT)
+    paginator = KeysetPaginator(rows, key_fields, per_page=limit)
+    page = paginator.get_page(after=params.get('after'))
+    return {
+        'results': [public(row) for row in page],
+        'next_cursor': page.next_cursor,
+    }
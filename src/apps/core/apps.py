@@ -5,4 +5,6 @@ class BusinessConfig(AppConfig):
     name = 'apps.core'
     
     def ready(self):
-        import apps.core.signals
\ No newline at end of file
+        import apps.core.signals
+        # Installs the per-request query timer on every new connection
+        import apps.core.instrumentation
\ No newline at end of file
@@ -0,0 +1,62 @@
+"""
+Status changes and deletes applied to many orders at once.
+
+Each operation is one UPDATE or DELETE per table inside one transaction, with
+the rollups refreshed once for the whole set afterwards. Saving or deleting
+the orders one by one would instead send signals for every row. Only the
+orders whose current status allows the transition are updated, and the check
+is part of the UPDATE's WHERE clause.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import dashboard_metrics, rollups, search
+from .models import Expense, ExpenseTerm, Order, OrderDailySummary, OrderItem
+
+MAX_ORDERS = 10000
+
+
+def _selected(orders, *fields):
+    rows = list(orders.order_by().values_list(*fields)[:MAX_ORDERS + 1])
+    if len(rows) > MAX_ORDERS:
+        raise ValueError(f'At most {MAX_ORDERS} orders can be changed at once; narrow the selection')
+    return rows
+
+
+def transition(orders, status):
+    """Move ``orders`` to ``status`` where the transition is allowed. Returns (updated, skipped)."""
+    if status not in Order.STATUS_TRANSITIONS:
+        raise ValueError(f'Orders cannot be moved to {status!r}')
+    with transaction.atomic():
+        ids = [pk for pk, in _selected(orders, 'pk')]
+        updated = Order.objects.filter(pk__in=ids, status__in=Order.STATUS_TRANSITIONS[status]).update(
+            status=status, updated_at=timezone.now(),
+        )
+        # The status appears in the recent orders widget and in the search documents
+        rollups.schedule('dashboard', {dashboard_metrics.RECENT_ORDERS})
+        rollups.schedule('search_index', {(search.ORDER, pk) for pk in ids})
+    return updated, len(ids) - updated
+
+
+def delete(orders):
+    """Delete ``orders`` with their items and expenses. Returns the number of orders deleted."""
+    with transaction.atomic():
+        rows = _selected(orders, 'pk', 'customer_id', 'created_at')
+        ids = [pk for pk, _, _ in rows]
+        expenses = list(Expense.objects.filter(order_id__in=ids).values_list('pk', 'expense_type', 'description', 'date'))
+        expense_ids = [pk for pk, _, _, _ in expenses]
+        # _raw_delete() issues a plain DELETE; the ORM's cascade would load and signal every row
+        OrderItem.objects.filter(order_id__in=ids)._raw_delete(OrderItem.objects.db)
+        Expense.objects.filter(pk__in=expense_ids)._raw_delete(Expense.objects.db)
+        deleted = Order.objects.filter(pk__in=ids)._raw_delete(Order.objects.db)
+        ExpenseTerm.record([usage for _, *usage in expenses], delta=-1)
+
+        rollups.schedule('customer_stats', {customer_id for _, customer_id, _ in rows})
+        rollups.schedule('daily_summary', {OrderDailySummary.day_of(created_at) for _, _, created_at in rows})
+        rollups.schedule('analytics', {OrderDailySummary.day_of(date) for _, _, _, date in expenses})
+        rollups.schedule('dashboard', {
+            dashboard_metrics.COUNTS, dashboard_metrics.RECENT_ORDERS, dashboard_metrics.TOP_CUSTOMERS,
+            *(dashboard_metrics.month_revenue_key(created_at) for _, _, created_at in rows),
+        })
+        rollups.schedule('search_index', {(search.ORDER, pk) for pk in ids} | {(search.EXPENSE, pk) for pk in expense_ids})
+    return deleted
@@ -0,0 +1,216 @@
+"""
+Dashboard figures computed with SQL aggregates and cached per widget.
+
+Each widget has its own cache key. The signal handlers in signals.py queue
+the keys a write affects and ``invalidate()`` drops exactly those once the
+transaction commits, so a new order doesn't evict anything else.
+
+Widgets computed on the read replica are cached under their own keys. An
+invalidation also records when it happened, and until the replica has been
+refreshed past that moment a replica request that misses computes the widget
+from ``default``. Otherwise the first page load after a write would cache
+the replica's older figures for the whole cache timeout.
+
+``get_metrics_async()`` loads the widgets concurrently on a small thread pool,
+each with its own timeout. A widget that is slow or failing is left out and
+listed in ``unavailable_widgets`` instead of holding up the whole page; its
+thread still finishes and caches the result for the next request.
+
+The hit, miss and invalidation counters behind ``cache_stats()`` are kept in
+the cache too, so every worker sharing the cache adds to the same figures.
+Backends without an atomic incr (the file cache) may drop the odd increment
+when workers count at the same moment, which is fine for a hit ratio.
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, router
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import Customer, Order, OrderDailySummary
+from .replica import max_staleness, reading_from, refreshed_at
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'dashboard:'
+
+COUNTS = 'counts'
+RECENT_ORDERS = 'recent_orders'
+TOP_CUSTOMERS = 'top_customers'
+
+# Seconds each widget may take on the async dashboard; DASHBOARD_WIDGET_TIMEOUTS overrides them
+WIDGET_TIMEOUTS = {'counts': 2.0, 'month_revenue': 2.0, 'recent_orders': 2.0, 'top_customers': 2.0}
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'DASHBOARD_WIDGET_WORKERS', 4), thread_name_prefix='dashboard-widgets',
+)
+
+COUNTERS = ('hits', 'misses', 'invalidations')
+
+
+def month_revenue_key(value):
+    """Cache key of the monthly revenue widget for the month containing ``value``."""
+    return f'month_revenue:{timezone.localtime(value):%Y-%m}'
+
+
+def _cache_timeout():
+    return getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300)
+
+
+def _counter_key(name):
+    return f'{KEY_PREFIX}stats:{name}'
+
+
+def _count(name):
+    key = _counter_key(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # First count since the cache was cleared; add() keeps a racing worker's count
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def _cache_key(key, alias=None):
+    # Widgets computed on the read replica are cached separately, so a stale
+    # replica can't overwrite figures that were just invalidated on default
+    return f'{KEY_PREFIX}{alias or router.db_for_read(Order) or DEFAULT_DB_ALIAS}:{key}'
+
+
+def _invalidated_key(key):
+    return f'{KEY_PREFIX}invalidated:{key}'
+
+
+def _replica_is_behind(key):
+    """Whether ``key`` was invalidated after the replica's data was last current."""
+    invalidated_at = cache.get(_invalidated_key(key))
+    if invalidated_at is None:
+        return False
+    snapshot_time = refreshed_at()
+    return snapshot_time is None or snapshot_time < invalidated_at
+
+
+def cached(key, compute):
+    alias = router.db_for_read(Order) or DEFAULT_DB_ALIAS
+    cache_key = _cache_key(key, alias)
+    value = cache.get(cache_key)
+    if value is None:
+        _count('misses')
+        if alias != DEFAULT_DB_ALIAS and _replica_is_behind(key):
+            with reading_from(None):
+                value = compute()
+        else:
+            value = compute()
+        cache.set(cache_key, value, _cache_timeout())
+    else:
+        _count('hits')
+    return value
+
+
+def invalidate(keys, aliases=None):
+    aliases = aliases or list(settings.DATABASES)
+    # Past max_staleness() the replica is either refreshed or not read at all
+    cache.set_many({_invalidated_key(key): time.time() for key in keys}, max_staleness())
+    cache.delete_many([_cache_key(key, alias) for key in keys for alias in aliases])
+    _count('invalidations')
+
+
+def cache_stats():
+    counts = cache.get_many([_counter_key(name) for name in COUNTERS])
+    hits, misses, invalidations = (counts.get(_counter_key(name), 0) for name in COUNTERS)
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'invalidations': invalidations,
+        'hit_ratio': round(hits / lookups, 4) if lookups else None,
+    }
+
+
+def compute_counts():
+    orders = Order.objects.aggregate(total_orders=Count('id'), total_ties_sold=Sum('number_of_ties'))
+    return {
+        'total_customers': Customer.objects.count(),
+        'total_orders': orders['total_orders'],
+        'total_ties_sold': orders['total_ties_sold'] or 0,
+    }
+
+
+def month_start(now=None):
+    now = timezone.localtime(now)
+    return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def compute_month_revenue(start):
+    return OrderDailySummary.objects.between(start=start.date()).totals()['revenue']
+
+
+def compute_recent_orders():
+    return list(Order.objects.select_related('customer').order_by('-created_at')[:5])
+
+
+def compute_top_customers():
+    return list(Customer.objects.select_related('stats').order_by(F('stats__lifetime_value').desc(nulls_last=True))[:5])
+
+
+def _widgets(start):
+    """name -> (cache key, compute function, value shown while the widget is unavailable)"""
+    return {
+        'counts': (COUNTS, compute_counts, {'total_customers': None, 'total_orders': None, 'total_ties_sold': None}),
+        'month_revenue': (month_revenue_key(start), lambda: compute_month_revenue(start), None),
+        'recent_orders': (RECENT_ORDERS, compute_recent_orders, []),
+        'top_customers': (TOP_CUSTOMERS, compute_top_customers, []),
+    }
+
+
+def _context(start, values):
+    return {
+        **values['counts'],
+        'recent_orders': values['recent_orders'],
+        'current_month_revenue': values['month_revenue'],
+        'current_month': start.strftime('%b %Y'),
+        'top_customers': values['top_customers'],
+    }
+
+
+def get_metrics():
+    start = month_start()
+    return _context(start, {name: cached(key, compute) for name, (key, compute, _) in _widgets(start).items()})
+
+
+def _load_in_worker(key, compute, alias):
+    try:
+        # The replica choice is thread-local, so it has to be re-entered in the worker
+        with reading_from(alias):
+            return cached(key, compute)
+    finally:
+        # Nothing else closes the connections this worker thread opened
+        close_old_connections()
+
+
+async def get_metrics_async(alias=None):
+    """Like get_metrics(), but with the widgets loaded concurrently under per-widget timeouts."""
+    start = month_start()
+    widgets = _widgets(start)
+    timeouts = {**WIDGET_TIMEOUTS, **getattr(settings, 'DASHBOARD_WIDGET_TIMEOUTS', {})}
+    load = sync_to_async(_load_in_worker, thread_sensitive=False, executor=_executor)
+    unavailable = []
+
+    async def load_widget(name, key, compute, fallback):
+        try:
+            return await asyncio.wait_for(load(key, compute, alias), timeouts[name])
+        except asyncio.TimeoutError:
+            logger.warning('Dashboard widget %s took longer than %ss', name, timeouts[name])
+        except Exception:
+            logger.exception('Dashboard widget %s failed', name)
+        unavailable.append(name)
+        return fallback
+
+    values = await asyncio.gather(*(load_widget(name, *widget) for name, widget in widgets.items()))
+    return {**_context(start, dict(zip(widgets, values))), 'unavailable_widgets': unavailable}
@@ -0,0 +1,174 @@
+"""
+CSV and XLSX exports of orders, customers and the financial report.
+
+Rows come straight from ``values_list(...).iterator()``, so no model instances
+are built and memory use doesn't grow with the table. CSV is streamed to the
+client line by line; XLSX has to be finished before it can be sent, so it is
+written to a temporary file with openpyxl's write-only workbook instead.
+
+Customer-entered text must not be evaluated as a formula. In CSV, text that
+starts like one (``=``, ``+``, ``-``, ``@``) is prefixed with ``'``, unless it is
+a plain number or phone number such as ``+234 803 000 0000``. In XLSX only
+``=`` starts a formula, and those cells are written as text with the quote
+prefix style, so the value itself is unchanged.
+"""
+import csv
+import re
+from datetime import datetime
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import reports
+from .models import Customer
+
+EXPORT_CHUNK_SIZE = 2000
+
+CSV = 'csv'
+XLSX = 'xlsx'
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+PLAIN_NUMBER = re.compile(r'[+-]?[\d\s().]+')
+FORMATS = {
+    CSV: 'text/csv',
+    XLSX: 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def order_rows(params):
+    """Every order matching the orders list filters: start, end, status and delivery_type."""
+    orders = reports.filtered_orders(
+        start=reports.parse_date(params.get('start')),
+        end=reports.parse_date(params.get('end')),
+        status=params.get('status') or None,
+        delivery_type=params.get('delivery_type') or None,
+    ).select_related('customer').order_by('created_at', 'pk')
+    header = [
+        'Order #', 'Date', 'Status', 'First name', 'Last name', 'Phone', 'Address', 'Ties', 'Cost per tie',
+        'Total amount', 'Total cost', 'Delivery fee', 'Delivery paid by', 'Customer delivery',
+        'Business delivery', 'Packaging boxes', 'Profit',
+    ]
+    rows = orders.values_list(
+        'order_number', 'created_at', 'status', 'customer__first_name', 'customer__last_name', 'customer__phone',
+        'customer__address', 'number_of_ties', 'cost_price_per_tie', 'total_amount', 'total_cost', 'delivery_fee',
+        'delivery_payment_type', 'customer_delivery_amount', 'business_delivery_amount', 'packaging_boxes', 'net_profit',
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    return header, rows
+
+
+def customer_rows(params):
+    """Every customer matching the customer directory's search, in its sort order, with their stats."""
+    customers = Customer.objects.all()
+    search_query = params.get('search')
+    if search_query:
+        customers = customers.filter(
+            Q(first_name__icontains=search_query) | Q(last_name__icontains=search_query)
+            | Q(phone__icontains=search_query) | Q(email__icontains=search_query)
+        )
+    sort_by = params.get('sort')
+    if sort_by == 'first_order':
+        customers = customers.order_by(F('stats__first_order_at').desc(nulls_last=True), 'pk')
+    elif sort_by == 'ties':
+        customers = customers.order_by(F('stats__ties_bought').desc(nulls_last=True), 'pk')
+    else:
+        customers = customers.order_by('first_name', 'last_name', 'pk')
+    header = [
+        'First name', 'Last name', 'Phone', 'Email', 'Address', 'Orders', 'Ties bought', 'Paid for ties',
+        'Lifetime value', 'First order', 'Latest order', 'Latest order #',
+    ]
+    rows = customers.values_list(
+        'first_name', 'last_name', 'phone', 'email', 'address', 'stats__order_count', 'stats__ties_bought',
+        'stats__total_amount', 'stats__lifetime_value', 'stats__first_order_at', 'stats__latest_order_at',
+        'stats__latest_order_number',
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    return header, rows
+
+
+def financial_report_rows(params):
+    """The report summary for start/end/expense_type, followed by every expense it covers."""
+    start, end = reports.parse_date(params.get('start')), reports.parse_date(params.get('end'))
+    expense_type = params.get('expense_type') or None
+    summary = reports.financial_summary(start, end, expense_type)
+    header = ['Date', 'Type', 'Description', 'Order #', 'Amount']
+
+    def rows():
+        for label, key in [
+            ('Orders', 'order_count'), ('Total revenue', 'total_revenue'),
+            ('Gross profit', 'gross_profit'), ('Order profit after delivery', 'order_profit'),
+            ('General expenses', 'general_expenses'), ('Order expenses', 'order_expenses'),
+            ('Business delivery', 'business_delivery'), ('Packaging expenses', 'packaging_expenses'),
+            ('Total expenses', 'total_expenses'), ('Net profit', 'net_profit'),
+        ]:
+            yield None, 'summary', label, None, summary[key]
+        yield from reports.filtered_expenses(start, end, expense_type).order_by('date', 'pk').values_list(
+            'date', 'expense_type', 'description', 'order__order_number', 'amount',
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    return header, rows()
+
+
+DATASETS = {
+    'orders': order_rows,
+    'customers': customer_rows,
+    'financial-report': financial_report_rows,
+}
+
+
+def filename(dataset, file_format):
+    return f'{dataset}-{timezone.localdate():%Y%m%d}.{file_format}'
+
+
+def _local(value):
+    # Spreadsheets have no time zones; export wall-clock time in the site's zone
+    if isinstance(value, datetime) and timezone.is_aware(value):
+        return timezone.localtime(value).replace(tzinfo=None)
+    return value
+
+
+def _csv_cell(value):
+    value = _local(value)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES) and not PLAIN_NUMBER.fullmatch(value):
+        return f"'{value}"
+    return value
+
+
+def _xlsx_cell(sheet, value):
+    from openpyxl.cell import WriteOnlyCell
+
+    value = _local(value)
+    if isinstance(value, str) and value.startswith('='):
+        cell = WriteOnlyCell(sheet, value=value)
+        cell.data_type = 's'
+        cell.quotePrefix = True
+        return cell
+    return value
+
+
+class _Echo:
+    """File-like object whose write() hands the line back, so csv.writer can feed a generator."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(header, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([_csv_cell(value) for value in row])
+
+
+def write_csv(header, rows, output):
+    for line in csv_lines(header, rows):
+        output.write(line)
+
+
+def write_xlsx(header, rows, output, title='Export'):
+    from openpyxl import Workbook
+
+    # Write-only workbooks flush rows to disk as they are appended
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title[:31])
+    sheet.append(header)
+    for row in rows:
+        sheet.append([_xlsx_cell(sheet, value) for value in row])
+    workbook.save(output)
@@ -0,0 +1,118 @@
+"""
+Product image processing.
+
+Uploaded tie photos are re-stored under the SHA-256 of their content
+(``ties/<hash>.<ext>``), with JPEG and WebP thumbnails next to them
+(``ties/thumbs/<hash>-<width>.<ext>``). Identical uploads share the same
+files, and a name always refers to the same bytes, so the web server can
+serve everything under ``ties/`` with a far-future immutable Cache-Control.
+
+Processing happens after the upload's transaction commits, on a single
+background thread, so the admin request that saved the product returns
+immediately. Until it finishes the product simply shows its original upload.
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Thumbnail widths; images are never scaled up
+SIZES = {'small': 160, 'medium': 480, 'large': 1200}
+FORMATS = {'jpeg': ('jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+           'webp': ('webp', {'quality': 80, 'method': 6})}
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='product-images')
+
+
+def needs_processing(product):
+    return bool(product.image) and product.image_variants.get('original') != product.image.name
+
+
+def schedule(product_id):
+    """Process the product's image once the current transaction commits."""
+    if getattr(settings, 'PRODUCT_IMAGES_IN_BACKGROUND', True):
+        transaction.on_commit(lambda: _executor.submit(_process_in_background, product_id))
+    else:
+        transaction.on_commit(lambda: process(product_id))
+
+
+def _process_in_background(product_id):
+    try:
+        process(product_id)
+    except Exception:
+        logger.exception('Processing the image of product %s failed', product_id)
+    finally:
+        # This thread isn't a request, so nothing else closes its connection
+        close_old_connections()
+
+
+def _render(image, width, fmt):
+    image = image.copy()
+    image.thumbnail((width, width * 4), Image.LANCZOS)
+    options = FORMATS[fmt][1]
+    output = BytesIO()
+    image.save(output, format=fmt.upper(), **options)
+    return output.getvalue()
+
+
+def _flatten(image):
+    # JPEG has no alpha channel, so transparent PNGs go on a white background
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _store(storage, name, content):
+    """Save ``content()`` as ``name`` unless it exists, and return the name it is stored under."""
+    if storage.exists(name):
+        return name
+    # If another process saved the same name first, the storage picks a new one
+    return storage.save(name, ContentFile(content()))
+
+
+def process(product_id, storage=default_storage):
+    """
+    Move the product's upload to its content-hash name and write any missing
+    thumbnails. Returns True if the product was updated.
+    """
+    from .models import Product
+
+    product = Product.objects.filter(pk=product_id).first()
+    if product is None or not needs_processing(product):
+        return False
+    uploaded = product.image.name
+    with storage.open(uploaded, 'rb') as file:
+        data = file.read()
+    digest = hashlib.sha256(data).hexdigest()
+    with Image.open(BytesIO(data)) as source:
+        extension = EXTENSIONS.get(source.format, (source.format or 'img').lower())
+        image = _flatten(ImageOps.exif_transpose(source))
+
+    original = _store(storage, f'ties/{digest}.{extension}', lambda: data)
+    variants = {'original': original, 'width': image.width, 'height': image.height, 'thumbnails': {}}
+    for size, width in SIZES.items():
+        width = min(width, image.width)
+        variants['thumbnails'][size] = names = {}
+        for fmt, (thumbnail_extension, _) in FORMATS.items():
+            names[fmt] = _store(
+                storage, f'ties/thumbs/{digest}-{width}.{thumbnail_extension}',
+                lambda: _render(image, width, fmt),
+            )
+
+    # Skip the update if another upload replaced the image in the meantime
+    updated = Product.objects.filter(pk=product_id, image=uploaded).update(image=original, image_variants=variants)
+    if updated and uploaded != original and not Product.objects.filter(image=uploaded).exists():
+        storage.delete(uploaded)
+    return bool(updated)
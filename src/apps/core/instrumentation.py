@@ -0,0 +1,218 @@
+"""
+Per-request SQL instrumentation.
+
+``RequestMetricsMiddleware`` counts every database query of a request and adds
+up their time, adds a ``Server-Timing`` header, and records the request in a
+per-view window of the most recent samples. ``prometheus_text()`` renders p50/p95/p99 latency and query
+counts from those windows for the staff-only metrics endpoint.
+
+The work per request is a couple of ``perf_counter()`` calls per query and one
+deque append, so it stays on in production. Percentiles are only computed when
+the metrics are scraped. The figures are per process, so every worker reports
+its own.
+
+Every connection gets an execute wrapper when it is opened, and the wrapper
+reports to the timer of the request in the current context. Context
+variables follow ``sync_to_async`` into other threads, so queries made by a
+sync view under ASGI, or by the async dashboard's widget workers, are
+counted for the request that caused them. Their times are added up, so with
+concurrent widgets the database time can exceed the request's total time.
+"""
+import contextvars
+import threading
+import time
+from collections import deque
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+_views = {}
+_views_lock = threading.Lock()
+
+_request_timer = contextvars.ContextVar('request_timer', default=None)
+
+
+def _window_size():
+    return getattr(settings, 'REQUEST_METRICS_WINDOW', 1000)
+
+
+class QueryTimer:
+    """An execute_wrapper that counts queries and accumulates their duration."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        # Widget workers of one request run queries at the same time
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            with self._lock:
+                self.duration += duration
+                self.count += 1
+
+
+def _time_query(execute, sql, params, many, context):
+    timer = _request_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def _install_query_timer(sender, connection, **kwargs):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+class ViewMetrics:
+    def __init__(self, window):
+        # (duration, queries, db_duration) of the most recent requests
+        self.samples = deque(maxlen=window)
+        self.requests = 0
+        self.duration_total = 0.0
+        self.queries_total = 0
+        self.db_duration_total = 0.0
+
+    def add(self, duration, queries, db_duration):
+        self.samples.append((duration, queries, db_duration))
+        self.requests += 1
+        self.duration_total += duration
+        self.queries_total += queries
+        self.db_duration_total += db_duration
+
+
+def record(view, duration, queries, db_duration):
+    with _views_lock:
+        metrics = _views.get(view)
+        if metrics is None:
+            metrics = _views[view] = ViewMetrics(_window_size())
+        metrics.add(duration, queries, db_duration)
+
+
+def quantile(sorted_values, q):
+    """Nearest-rank quantile of an already sorted list."""
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(q * len(sorted_values)) - 1))]
+
+
+def snapshot():
+    """``{view: {'requests', 'p50', 'p95', 'p99', 'queries_p50', ...}}`` over each view's window."""
+    with _views_lock:
+        views = {
+            view: (list(metrics.samples), metrics.requests, metrics.duration_total,
+                   metrics.queries_total, metrics.db_duration_total)
+            for view, metrics in _views.items()
+        }
+    result = {}
+    for view, (samples, requests, duration_total, queries_total, db_duration_total) in sorted(views.items()):
+        durations = sorted(sample[0] for sample in samples)
+        queries = sorted(sample[1] for sample in samples)
+        stats = {
+            'requests': requests,
+            'duration_total': duration_total,
+            'queries_total': queries_total,
+            'db_duration_total': db_duration_total,
+        }
+        for q in QUANTILES:
+            name = f'p{round(q * 100)}'
+            stats[name] = quantile(durations, q)
+            stats[f'queries_{name}'] = quantile(queries, q)
+        result[view] = stats
+    return result
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text():
+    """The per-view metrics in the Prometheus text exposition format."""
+    views = snapshot()
+    window = _window_size()
+    lines = [
+        f'# HELP mytie_request_duration_seconds Request latency by view; quantiles over the last {window} requests.',
+        '# TYPE mytie_request_duration_seconds summary',
+    ]
+    for view, stats in views.items():
+        for q in QUANTILES:
+            lines.append(f'mytie_request_duration_seconds{{view="{_label(view)}",quantile="{q}"}} '
+                         f'{stats[f"p{round(q * 100)}"]:.6f}')
+        lines.append(f'mytie_request_duration_seconds_sum{{view="{_label(view)}"}} {stats["duration_total"]:.6f}')
+        lines.append(f'mytie_request_duration_seconds_count{{view="{_label(view)}"}} {stats["requests"]}')
+    lines += [
+        f'# HELP mytie_request_queries Database queries per request by view; quantiles over the last {window} requests.',
+        '# TYPE mytie_request_queries summary',
+    ]
+    for view, stats in views.items():
+        for q in QUANTILES:
+            lines.append(f'mytie_request_queries{{view="{_label(view)}",quantile="{q}"}} '
+                         f'{stats[f"queries_p{round(q * 100)}"]}')
+        lines.append(f'mytie_request_queries_sum{{view="{_label(view)}"}} {stats["queries_total"]}')
+        lines.append(f'mytie_request_queries_count{{view="{_label(view)}"}} {stats["requests"]}')
+    lines += [
+        '# HELP mytie_request_db_seconds_total Time spent in database queries by view.',
+        '# TYPE mytie_request_db_seconds_total counter',
+    ]
+    for view, stats in views.items():
+        lines.append(f'mytie_request_db_seconds_total{{view="{_label(view)}"}} {stats["db_duration_total"]:.6f}')
+    return '\n'.join(lines) + '\n'
+
+
+class RequestMetricsMiddleware:
+    """
+    Times each request and its queries. Keep it first in MIDDLEWARE so the
+    timing includes the other middleware. Queries run while a streaming
+    response is being sent happen after it returns and are not counted.
+    Works in both sync and async stacks, so it doesn't make Django adapt an
+    async view back to sync.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self._acall(request)
+        timer = QueryTimer()
+        token = _request_timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_timer.reset(token)
+        return self._finish(request, response, timer, time.perf_counter() - started)
+
+    async def _acall(self, request):
+        timer = QueryTimer()
+        token = _request_timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_timer.reset(token)
+        return self._finish(request, response, timer, time.perf_counter() - started)
+
+    def _finish(self, request, response, timer, duration):
+        match = getattr(request, 'resolver_match', None)
+        record(match.view_name if match else 'unresolved', duration, timer.count, timer.duration)
+        if 'Server-Timing' not in response:
+            response['Server-Timing'] = (
+                f'db;dur={timer.duration * 1000:.1f};desc="{timer.count} queries", '
+                f'total;dur={duration * 1000:.1f}'
+            )
+        return response
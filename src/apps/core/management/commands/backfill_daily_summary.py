@@ -0,0 +1,48 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max, Min
+
+from apps.core import analytics
+from apps.core.models import Order, OrderDailySummary
+
+
+class Command(BaseCommand):
+    help = 'Backfill or repair the OrderDailySummary rollup for a date range, in batches of days'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='First day (YYYY-MM-DD), defaults to the first order')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day (YYYY-MM-DD), defaults to the latest order')
+        parser.add_argument('--batch-days', type=int, default=31)
+
+    def handle(self, *args, **options):
+        if options['batch_days'] < 1:
+            raise CommandError('--batch-days must be at least 1')
+        start, end = options['start'], options['end']
+        if not start or not end:
+            bounds = Order.objects.aggregate(first=Min('created_at'), last=Max('created_at'))
+            if bounds['first'] is None:
+                self.stdout.write('No orders to summarize')
+                return
+            start = start or OrderDailySummary.day_of(bounds['first'])
+            end = end or OrderDailySummary.day_of(bounds['last'])
+        if start > end:
+            raise CommandError('--start must not be after --end')
+
+        began = time.monotonic()
+        day, days_done, rows_written = start, 0, 0
+        while day <= end:
+            batch_end = min(day + timedelta(days=options['batch_days'] - 1), end)
+            days = [day + timedelta(days=offset) for offset in range((batch_end - day).days + 1)]
+            with transaction.atomic():
+                rows_written += len(OrderDailySummary.refresh(days))
+            analytics.invalidate(days)
+            days_done += len(days)
+            self.stdout.write(f'{day} .. {batch_end}: done')
+            day = batch_end + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Summarized {days_done} days ({rows_written} with orders) in {time.monotonic() - began:.1f}s'
+        ))
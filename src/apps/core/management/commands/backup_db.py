@@ -0,0 +1,151 @@
+import gzip
+import os
+import shutil
+import sqlite3
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+PREFIX = 'db-'
+SUFFIXES = ('.sqlite3', '.sqlite3.gz')
+
+
+class BackupRestarted(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Back up the SQLite database online with the backup API, a few pages at a time so writers are '
+        'not blocked for the whole copy, then verify it, optionally gzip it and prune old backups'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-dir', type=Path, default=None,
+                            help='Where to write backups (defaults to the BACKUP_DIR setting)')
+        parser.add_argument('--pages', type=int, default=1024,
+                            help='Pages copied per step; the database is unlocked between steps')
+        parser.add_argument('--pause', type=float, default=0.005,
+                            help='Seconds to sleep between steps so writers can get in')
+        parser.add_argument('--max-restarts', type=int, default=3,
+                            help='A write from another connection restarts a stepped copy; after this many '
+                                 'restarts the rest is copied in one step')
+        parser.add_argument('--compress', action='store_true', help='Gzip the verified backup')
+        parser.add_argument('--keep', type=int, default=None,
+                            help='Backups to keep, oldest are deleted (defaults to the BACKUP_KEEP setting)')
+        parser.add_argument('--quick', action='store_true',
+                            help='Verify with PRAGMA quick_check instead of the full integrity_check')
+
+    def handle(self, *args, **options):
+        database = settings.DATABASES[DEFAULT_DB_ALIAS]
+        if database['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('backup_db only supports SQLite; use the database server\'s own backup tools')
+        source_path = Path(database['NAME'])
+        if not source_path.exists():
+            raise CommandError(f'{source_path} does not exist')
+        if options['pages'] < 1 or options['max_restarts'] < 1:
+            raise CommandError('--pages and --max-restarts must be at least 1')
+        keep = options['keep'] if options['keep'] is not None else getattr(settings, 'BACKUP_KEEP', 14)
+        if keep < 1:
+            raise CommandError('--keep must be at least 1')
+        output_dir = options['output_dir'] or Path(getattr(settings, 'BACKUP_DIR', settings.BASE_DIR / 'backups'))
+        output_dir.mkdir(parents=True, exist_ok=True)
+        self.verbosity = options['verbosity']
+
+        # Microseconds keep backups taken within the same second apart, so pruning sees each one
+        name = f'{PREFIX}{timezone.now():%Y%m%d-%H%M%S-%f}.sqlite3'
+        temporary_path = output_dir / f'{name}.tmp'
+        try:
+            began = time.monotonic()
+            steps = self.copy(source_path, temporary_path, options['pages'], options['pause'], options['max_restarts'])
+            copied = time.monotonic() - began
+            size = temporary_path.stat().st_size
+            self.stdout.write(
+                f'Copied {size / 1024 / 1024:.1f} MB in {copied:.2f}s over {steps} steps '
+                f'({size / 1024 / 1024 / max(copied, 1e-6):.1f} MB/s)'
+            )
+
+            checked = time.monotonic()
+            self.verify(temporary_path, 'quick_check' if options['quick'] else 'integrity_check')
+            self.stdout.write(f'Verified in {time.monotonic() - checked:.2f}s')
+
+            if options['compress']:
+                compressed = time.monotonic()
+                name += '.gz'
+                compressed_path = output_dir / f'{name}.tmp'
+                with open(temporary_path, 'rb') as raw, gzip.open(compressed_path, 'wb', compresslevel=6) as packed:
+                    shutil.copyfileobj(raw, packed, 1024 * 1024)
+                temporary_path.unlink()
+                temporary_path = compressed_path
+                self.stdout.write(
+                    f'Compressed to {temporary_path.stat().st_size / 1024 / 1024:.1f} MB '
+                    f'in {time.monotonic() - compressed:.2f}s'
+                )
+            # Only complete, verified backups ever carry the final name
+            backup_path = output_dir / name
+            os.replace(temporary_path, backup_path)
+        finally:
+            temporary_path.unlink(missing_ok=True)
+
+        removed = self.prune(output_dir, keep)
+        self.stdout.write(self.style.SUCCESS(
+            f'Backed up to {backup_path} in {time.monotonic() - began:.2f}s'
+            + (f', removed {len(removed)} old backup(s)' if removed else '')
+        ))
+
+    def copy(self, source_path, target_path, pages, pause, max_restarts):
+        steps, restarts, previous = 0, 0, None
+
+        def progress(status, remaining, total):
+            nonlocal steps, restarts, previous
+            steps += 1
+            if previous is not None and remaining >= previous:
+                restarts += 1
+                self.stdout.write(f'  Database changed during the copy, restarted ({restarts}/{max_restarts})')
+                if restarts >= max_restarts:
+                    raise BackupRestarted
+            previous = remaining
+            if self.verbosity > 1:
+                self.stdout.write(f'  {total - remaining}/{total} pages')
+            if remaining and pause:
+                time.sleep(pause)
+
+        # Opened read-only so a wrong path can never create an empty database
+        source = sqlite3.connect(f'file:{source_path}?mode=ro', uri=True)
+        target = sqlite3.connect(target_path)
+        try:
+            try:
+                source.backup(target, pages=pages, progress=progress)
+            except BackupRestarted:
+                # Writes keep landing between steps; take the whole copy under a
+                # single read lock, which holds writers back for one copy at most
+                self.stdout.write(self.style.WARNING('Too many restarts, copying in a single step'))
+                source.backup(target)
+                steps += 1
+        finally:
+            target.close()
+            source.close()
+        return steps
+
+    def verify(self, path, pragma):
+        connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            problems = [row[0] for row in connection.execute(f'PRAGMA {pragma}')]
+        finally:
+            connection.close()
+        if problems != ['ok']:
+            raise CommandError('Backup failed verification:\n' + '\n'.join(problems[:20]))
+
+    def prune(self, output_dir, keep):
+        backups = sorted(
+            path for path in output_dir.iterdir()
+            if path.name.startswith(PREFIX) and path.name.endswith(SUFFIXES)
+        )
+        removed = backups[:-keep]
+        for path in removed:
+            path.unlink()
+        return removed
@@ -0,0 +1,255 @@
+import csv
+import json
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from apps.core import dashboard_metrics, rollups, search
+from apps.core.models import Customer, Order, OrderDailySummary, Sequence
+from apps.core.reports import parse_date
+
+MAX_REPORTED_ERRORS = 20
+
+
+def read_rows(path, file_format):
+    """Yield ``(line_number, row_dict)`` pairs one at a time, without loading the whole file."""
+    with open(path, newline='', encoding='utf-8-sig') as handle:
+        if file_format == 'csv':
+            reader = csv.DictReader(handle)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(handle, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield line_number, e
+                    continue
+                yield line_number, row if isinstance(row, dict) else ValueError('expected a JSON object')
+
+
+def _text(row, key, default=''):
+    value = row.get(key)
+    return default if value is None else str(value).strip()
+
+
+def _decimal(row, *keys):
+    for key in keys:
+        value = _text(row, key)
+        if value:
+            try:
+                return Decimal(value.replace(',', ''))
+            except InvalidOperation:
+                raise ValueError(f'{key} is not a number: {value!r}')
+    return Decimal('0')
+
+
+def _integer(row, key, default):
+    value = _text(row, key)
+    if not value:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f'{key} is not a whole number: {value!r}')
+    if number < 0:
+        raise ValueError(f'{key} must not be negative')
+    return number
+
+
+def parse_row(row):
+    """Validate one input row and return ``(customer_fields, order_fields)``, raising ValueError."""
+    phone = _text(row, 'phone')
+    if not phone:
+        raise ValueError('phone is required')
+    if _text(row, 'first_name') or _text(row, 'last_name'):
+        first_name, last_name = _text(row, 'first_name'), _text(row, 'last_name')
+    else:
+        name_parts = _text(row, 'name').split(' ', 1)
+        first_name, last_name = name_parts[0], name_parts[1] if len(name_parts) > 1 else ''
+
+    order_date = parse_date(_text(row, 'order_date'))
+    if order_date is None:
+        raise ValueError(f"order_date must be YYYY-MM-DD or DD/MM/YYYY, got {_text(row, 'order_date')!r}")
+    delivery_payment_type = _text(row, 'delivery_payment_type', 'customer') or 'customer'
+    if delivery_payment_type not in dict(Order.DELIVERY_CHOICES):
+        raise ValueError(f'unknown delivery_payment_type {delivery_payment_type!r}')
+    status = _text(row, 'status', 'new') or 'new'
+    if status not in dict(Order.STATUS_CHOICES):
+        raise ValueError(f'unknown status {status!r}')
+
+    number_of_ties = _integer(row, 'number_of_ties', 1)
+    cost_price_per_tie = _decimal(row, 'cost_price_per_tie')
+    customer_delivery = _decimal(row, 'customer_delivery_amount')
+    business_delivery = _decimal(row, 'business_delivery_amount')
+    customer_fields = {
+        'first_name': first_name,
+        'last_name': last_name,
+        'email': _text(row, 'email'),
+        'phone': phone,
+        'address': _text(row, 'address'),
+    }
+    order_fields = {
+        'order_number': _text(row, 'order_number'),
+        'status': status,
+        'number_of_ties': number_of_ties,
+        'cost_price_per_tie': cost_price_per_tie,
+        'total_amount': _decimal(row, 'total_amount', 'total_cost_of_ties'),
+        'total_cost': cost_price_per_tie * number_of_ties,
+        'delivery_fee': customer_delivery + business_delivery,
+        'delivery_payment_type': delivery_payment_type,
+        'customer_delivery_amount': customer_delivery,
+        'business_delivery_amount': business_delivery,
+        'packaging_boxes': _integer(row, 'packaging_boxes', 0),
+        'created_at': timezone.make_aware(datetime.combine(order_date, datetime.min.time())),
+    }
+    return customer_fields, order_fields
+
+
+class Command(BaseCommand):
+    help = (
+        'Import orders from a CSV or JSONL file, streaming it in batches. Columns: name (or first_name/last_name), '
+        'phone, address, email, order_date, number_of_ties, cost_price_per_tie, total_amount, delivery_payment_type, '
+        'customer_delivery_amount, business_delivery_amount, packaging_boxes, status and an optional order_number. '
+        'Customers are matched by phone number.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Validate every row without writing anything')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.is_file():
+            raise CommandError(f'{path} does not exist')
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in ('csv', 'jsonl'):
+            raise CommandError('Unknown file format, pass --format csv or --format jsonl')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        self.dry_run = options['dry_run']
+
+        # phone -> customer id (None for customers a dry run would create)
+        self.customers = {}
+        self.order_numbers_seen = set()
+        self.highest_explicit_number = 0
+        self.errors = 0
+        self.rows = self.customers_created = self.orders_created = 0
+
+        began = time.monotonic()
+        rows = read_rows(path, file_format)
+        while True:
+            batch = list(islice(rows, options['batch_size']))
+            if not batch:
+                break
+            self.import_batch(batch)
+            self.rows += len(batch)
+            elapsed = time.monotonic() - began
+            self.stdout.write(f'{self.rows} rows read, {self.orders_created} orders '
+                              f'({self.rows / elapsed if elapsed else 0:.0f} rows/s)')
+
+        elapsed = time.monotonic() - began
+        verb = 'Would import' if self.dry_run else 'Imported'
+        summary = (
+            f'{verb} {self.orders_created} orders and {self.customers_created} new customers from {self.rows} rows '
+            f'in {elapsed:.1f}s ({self.rows / elapsed if elapsed else 0:.0f} rows/s)'
+        )
+        if self.errors:
+            self.stdout.write(self.style.WARNING(f'{summary}; skipped {self.errors} invalid rows'))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
+
+    def reject(self, line_number, message):
+        self.errors += 1
+        if self.errors <= MAX_REPORTED_ERRORS:
+            self.stderr.write(f'Line {line_number}: {message}')
+        elif self.errors == MAX_REPORTED_ERRORS + 1:
+            self.stderr.write('Further errors are counted but not shown')
+
+    def import_batch(self, batch):
+        parsed = []
+        for line_number, row in batch:
+            try:
+                if isinstance(row, Exception):
+                    raise ValueError(row)
+                parsed.append((line_number, *parse_row(row)))
+            except ValueError as e:
+                self.reject(line_number, e)
+
+        explicit_numbers = {order['order_number'] for _, _, order in parsed if order['order_number']}
+        taken = set(Order.objects.filter(order_number__in=explicit_numbers).values_list('order_number', flat=True))
+        valid = []
+        for line_number, customer, order in parsed:
+            number = order['order_number']
+            if number and (number in taken or number in self.order_numbers_seen):
+                self.reject(line_number, f'order number {number} already exists')
+                continue
+            if number:
+                self.order_numbers_seen.add(number)
+                if number.isdigit():
+                    self.highest_explicit_number = max(self.highest_explicit_number, int(number))
+            valid.append((customer, order))
+
+        # Dedupe customers by phone: known ones from earlier batches, then the database, then new
+        unknown = {customer['phone'] for customer, _ in valid} - self.customers.keys()
+        # Newest first, so the oldest customer wins when a phone number is already duplicated
+        for phone, pk in Customer.objects.filter(phone__in=unknown).order_by('-pk').values_list('phone', 'pk'):
+            self.customers[phone] = pk
+        new_customers = {}
+        for customer, _ in valid:
+            if customer['phone'] not in self.customers:
+                new_customers.setdefault(customer['phone'], Customer(**customer))
+
+        self.customers_created += len(new_customers)
+        self.orders_created += len(valid)
+        if self.dry_run:
+            self.customers.update(dict.fromkeys(new_customers))
+            return
+
+        with transaction.atomic():
+            for created in Customer.objects.bulk_create(new_customers.values()):
+                self.customers[created.phone] = created.pk
+            if self.highest_explicit_number:
+                self.advance_sequence()
+            unnumbered = sum(1 for _, order in valid if not order['order_number'])
+            numbers = iter(Order.allocate_order_numbers(unnumbered) if unnumbered else [])
+            orders = []
+            for customer, fields in valid:
+                order = Order(customer_id=self.customers[customer['phone']], **fields)
+                order.order_number = order.order_number or next(numbers)
+                orders.append(order)
+            Order.objects.bulk_create(orders)
+            self.schedule_rollups(new_customers.values(), orders)
+
+    def advance_sequence(self):
+        # Keep generated numbers clear of the ones that came with the file so far,
+        # before this batch reserves any
+        Sequence.objects.get_or_create(
+            name=Sequence.ORDER_NUMBER, defaults={'last_value': Sequence.initial_value(Sequence.ORDER_NUMBER)}
+        )
+        Sequence.objects.filter(
+            name=Sequence.ORDER_NUMBER, last_value__lt=self.highest_explicit_number
+        ).update(last_value=self.highest_explicit_number)
+
+    def schedule_rollups(self, customers, orders):
+        # bulk_create() sends no signals, so queue what the signal handlers would have
+        rollups.schedule('customer_stats', {order.customer_id for order in orders} | {c.pk for c in customers})
+        rollups.schedule('daily_summary', {OrderDailySummary.day_of(order.created_at) for order in orders})
+        rollups.schedule('dashboard', {
+            dashboard_metrics.COUNTS, dashboard_metrics.RECENT_ORDERS, dashboard_metrics.TOP_CUSTOMERS,
+            *(dashboard_metrics.month_revenue_key(order.created_at) for order in orders),
+        })
+        rollups.schedule('search_index', {
+            *((search.CUSTOMER, c.pk) for c in customers if c.pk),
+            *((search.ORDER, order.pk) for order in orders if order.pk),
+        })
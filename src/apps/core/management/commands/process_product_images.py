@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.core import images
+from apps.core.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Generate content-hash names and thumbnails for product images that have not been processed yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Reprocess every product image, e.g. after changing the thumbnail sizes')
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='').exclude(image__isnull=True).order_by('pk')
+        if options['all']:
+            products.update(image_variants={})
+        began = time.monotonic()
+        processed = failed = 0
+        for product in products.only('pk', 'image', 'image_variants').iterator(chunk_size=200):
+            if not images.needs_processing(product):
+                continue
+            try:
+                if images.process(product.pk):
+                    processed += 1
+            except Exception as e:
+                # A missing, corrupt or oversized image shouldn't stop the rest of the backfill
+                failed += 1
+                self.stderr.write(f'{product}: {e}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} product images in {time.monotonic() - began:.1f}s'
+            + (f', {failed} failed' if failed else '')
+        ))
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from apps.core.models import CustomerCohortMonth, CustomerStats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the CustomerCohortMonth rollup table from orders, or report drift with --check'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report cohort cells that are stale')
+        parser.add_argument('--batch-size', type=int, default=12, help='Cohorts recomputed per query')
+
+    def handle(self, *args, **options):
+        check = options['check']
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+        first_months = (
+            CustomerStats.objects.filter(first_order_at__isnull=False)
+            .annotate(cohort=TruncMonth('first_order_at', tzinfo=timezone.get_current_timezone()))
+            .values_list('cohort', flat=True)
+            .distinct()
+        )
+        cohorts = sorted({timezone.localtime(cohort).date() for cohort in first_months})
+
+        drifted = 0
+        for start in range(0, len(cohorts), batch_size):
+            batch = cohorts[start:start + batch_size]
+            fresh = {(row.cohort, row.month): row for row in CustomerCohortMonth.compute(batch)}
+            stored = {(row.cohort, row.month): row for row in CustomerCohortMonth.objects.filter(cohort__in=batch)}
+            for cell in sorted(fresh.keys() | stored.keys()):
+                expected, current = fresh.get(cell), stored.get(cell)
+                values = [
+                    tuple(getattr(row, name) for name in CustomerCohortMonth.TOTAL_FIELDS) if row else None
+                    for row in (expected, current)
+                ]
+                if values[0] != values[1]:
+                    drifted += 1
+                    if check:
+                        self.stdout.write(f'Cohort {cell[0]:%Y-%m} in {cell[1]:%Y-%m}: stored {values[1]}, expected {values[0]}')
+            if not check:
+                with transaction.atomic():
+                    CustomerCohortMonth.refresh(batch)
+
+        # Cohorts whose customers have all moved to another month or been deleted
+        orphans = CustomerCohortMonth.objects.exclude(cohort__in=cohorts)
+        orphan_count = orphans.count()
+        drifted += orphan_count
+        if check:
+            if orphan_count:
+                self.stdout.write(f'{orphan_count} cells belong to cohorts that no longer have customers')
+            if drifted:
+                raise CommandError(f'{drifted} cohort cells are stale')
+            self.stdout.write(self.style.SUCCESS(f'All {len(cohorts)} cohorts are up to date'))
+        else:
+            orphans.delete()
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(cohorts)} cohorts ({drifted} cells were stale)'))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.models import Customer, CustomerStats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the CustomerStats rollup table from orders, or report drift with --check'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report customers whose stored stats are stale')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        check = options['check']
+        batch_size = options['batch_size']
+        customer_ids = list(Customer.objects.order_by('pk').values_list('pk', flat=True))
+
+        drifted = 0
+        for start in range(0, len(customer_ids), batch_size):
+            batch = customer_ids[start:start + batch_size]
+            fresh = CustomerStats.compute(batch)
+            stored = CustomerStats.objects.in_bulk(batch)
+            for stats in fresh:
+                current = stored.get(stats.customer_id)
+                if current is None:
+                    drifted += 1
+                    if check:
+                        self.stdout.write(f'Customer {stats.customer_id}: missing stats row')
+                    continue
+                fields = stats.differences(current)
+                if fields:
+                    drifted += 1
+                    if check:
+                        self.stdout.write(f"Customer {stats.customer_id}: stale {', '.join(fields)}")
+            if not check:
+                CustomerStats.store(fresh)
+
+        if check:
+            if drifted:
+                raise CommandError(f'{drifted} of {len(customer_ids)} customers have stale stats')
+            self.stdout.write(self.style.SUCCESS(f'All {len(customer_ids)} customers are up to date'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Rebuilt stats for {len(customer_ids)} customers ({drifted} were stale or missing)'
+            ))
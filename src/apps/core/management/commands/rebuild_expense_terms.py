@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.core.models import Expense, ExpenseTerm
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the expense type and description autocomplete dictionary from expenses, or report drift with --check'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report terms whose stored counts are stale')
+
+    def handle(self, *args, **options):
+        usages = ExpenseTerm.usages(
+            Expense.objects.values_list('expense_type', 'description', 'date').iterator(chunk_size=5000)
+        )
+        fresh = {
+            key: ExpenseTerm(kind=key[0], normalized=key[1], value=value, usage_count=uses, last_used_at=used_at)
+            for key, (value, uses, used_at) in usages.items()
+        }
+        stored = {(term.kind, term.normalized): term for term in ExpenseTerm.objects.all()}
+
+        drifted = 0
+        for key in sorted(fresh.keys() | stored.keys()):
+            expected, current = fresh.get(key), stored.get(key)
+            counts = [term.usage_count if term else 0 for term in (expected, current)]
+            if counts[0] != counts[1]:
+                drifted += 1
+                if options['check']:
+                    self.stdout.write(f'{key[0]} "{key[1]}": stored {counts[1]}, expected {counts[0]}')
+
+        if options['check']:
+            if drifted:
+                raise CommandError(f'{drifted} of {len(fresh)} terms are stale')
+            self.stdout.write(self.style.SUCCESS(f'All {len(fresh)} terms are up to date'))
+            return
+        with transaction.atomic():
+            ExpenseTerm.objects.all().delete()
+            ExpenseTerm.objects.bulk_create(fresh.values(), batch_size=500)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(fresh)} terms ({drifted} were stale or missing)'))
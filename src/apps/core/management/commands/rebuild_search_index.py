@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.core import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index over customers, orders and expenses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not search.fts_enabled():
+            raise CommandError('The full-text index is only used on SQLite; other databases search directly')
+        began = time.monotonic()
+        with transaction.atomic():
+            indexed = search.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} documents in {time.monotonic() - began:.1f}s'))
@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.core import rollups
+from apps.core.models import Order, OrderDailySummary
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored gross_profit and net_profit of every order in chunks, or report drift with --check'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report orders whose stored profit is stale')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        check = options['check']
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+        fields = ['pk', 'created_at', *Order.PROFIT_FIELDS, *Order.PROFIT_INPUTS]
+
+        began = time.monotonic()
+        last_pk, total, drifted = 0, 0, 0
+        while True:
+            # Keyset chunks by primary key, so late chunks cost the same as early ones
+            orders = list(Order.objects.filter(pk__gt=last_pk).order_by('pk').only(*fields)[:batch_size])
+            if not orders:
+                break
+            last_pk = orders[-1].pk
+            total += len(orders)
+            stale = []
+            for order in orders:
+                stored = (order.gross_profit, order.net_profit)
+                order.update_profit()
+                if (order.gross_profit, order.net_profit) != stored:
+                    stale.append(order)
+                    if check:
+                        self.stdout.write(
+                            f'Order {order.pk}: stored {stored[0]}/{stored[1]}, '
+                            f'expected {order.gross_profit}/{order.net_profit}'
+                        )
+            drifted += len(stale)
+            if stale and not check:
+                with transaction.atomic():
+                    Order.objects.bulk_update(stale, Order.PROFIT_FIELDS)
+                    # bulk_update() sends no signals; the daily summary sums net_profit
+                    rollups.schedule('daily_summary', {OrderDailySummary.day_of(order.created_at) for order in stale})
+            if not check:
+                self.stdout.write(f'{total} orders checked, {drifted} updated')
+
+        if check:
+            if drifted:
+                raise CommandError(f'{drifted} of {total} orders have a stale gross or net profit')
+            self.stdout.write(self.style.SUCCESS(f'All {total} orders are up to date'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Recomputed {total} orders in {time.monotonic() - began:.1f}s ({drifted} were stale)'
+            ))
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core import dashboard_metrics, replica
+
+
+class Command(BaseCommand):
+    help = 'Refresh the read-only SQLite replica used by the reporting pages from the main database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, metavar='SECONDS',
+                            help='Keep running and refresh at this interval instead of once')
+
+    def handle(self, *args, **options):
+        interval = options['every']
+        if interval is not None and interval >= replica.max_staleness():
+            self.stderr.write(self.style.WARNING(
+                f'Refreshing every {interval:g}s leaves the replica unused for part of each interval '
+                f'(REPLICA_MAX_STALENESS is {replica.max_staleness()}s)'
+            ))
+        while True:
+            began = time.monotonic()
+            try:
+                size = replica.refresh_snapshot()
+            except ValueError as e:
+                raise CommandError(e)
+            # Widgets cached from the previous snapshot are out of date now
+            dashboard_metrics.invalidate([
+                dashboard_metrics.COUNTS, dashboard_metrics.RECENT_ORDERS, dashboard_metrics.TOP_CUSTOMERS,
+                dashboard_metrics.month_revenue_key(dashboard_metrics.month_start()),
+            ], aliases=[replica.REPLICA_ALIAS])
+            self.stdout.write(self.style.SUCCESS(
+                f'Replica refreshed ({size / 1024 / 1024:.1f} MB) in {time.monotonic() - began:.2f}s'
+            ))
+            if interval is None:
+                return
+            time.sleep(max(0, interval - (time.monotonic() - began)))
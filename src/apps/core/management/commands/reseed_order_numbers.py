@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.core.models import Order, Sequence
+
+
+class Command(BaseCommand):
+    help = 'Re-seed the order number sequence from the highest existing order number'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--allow-decrease', action='store_true',
+                            help='Allow moving the sequence backwards (re-using numbers of deleted orders)')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            highest = Order.highest_order_number()
+            sequence, created = Sequence.objects.select_for_update().get_or_create(
+                name=Sequence.ORDER_NUMBER, defaults={'last_value': highest}
+            )
+            previous = sequence.last_value
+            if not created and (highest > previous or options['allow_decrease']):
+                sequence.last_value = highest
+                sequence.save(update_fields=['last_value'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Order number sequence at {sequence.last_value} (was {"unset" if created else previous}, '
+            f'highest existing order number {highest}); next order will be {Order.format_order_number(sequence.last_value + 1)}'
+        ))
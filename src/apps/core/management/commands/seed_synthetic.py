@@ -0,0 +1,189 @@
+import random
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from apps.core import analytics, dashboard_metrics, rollups
+from apps.core.models import Customer, Expense, Order, OrderItem, Product
+
+FIRST_NAMES = ['Chinedu', 'Amaka', 'Tunde', 'Ngozi', 'Emeka', 'Funke', 'Segun', 'Aisha', 'Ibrahim', 'Kemi',
+               'Uche', 'Bola', 'Yemi', 'Zainab', 'Femi', 'Chioma', 'Musa', 'Ada', 'Gbenga', 'Halima']
+LAST_NAMES = ['Okafor', 'Adeyemi', 'Bello', 'Eze', 'Ogunleye', 'Abubakar', 'Nwosu', 'Balogun', 'Okonkwo',
+              'Lawal', 'Adebayo', 'Obi', 'Usman', 'Afolabi', 'Nnamdi', 'Ibekwe', 'Salami', 'Ojo']
+STREETS = ['Allen Avenue, Ikeja', 'Admiralty Way, Lekki', 'Awolowo Road, Ikoyi', 'Herbert Macaulay Way, Yaba',
+           'Ademola Adetokunbo Crescent, Wuse 2', 'Aminu Kano Crescent, Abuja', 'Trans Amadi Road, Port Harcourt']
+EXPENSE_TYPES = ['packaging', 'transport', 'advertising', 'data', 'rent', 'supplies']
+# Weights in the order of Order.STATUS_CHOICES (new, processing, shipped, delivered, returned)
+STATUS_WEIGHTS = dict(zip((status for status, _ in Order.STATUS_CHOICES), (3, 4, 5, 84, 4)))
+DELIVERY_WEIGHTS = {'customer': 60, 'business': 25, 'shared': 15}
+
+
+class Command(BaseCommand):
+    help = (
+        'Add a reproducible synthetic dataset (customers, orders, items and expenses) with bulk_create, '
+        'then rebuild the rollup tables. Intended for benchmarks and load testing, not production data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--max-items', type=int, default=3, help='Items per order are drawn from 0..max')
+        parser.add_argument('--expenses', type=int, default=2000)
+        parser.add_argument('--products', type=int, default=50)
+        parser.add_argument('--days', type=int, default=730, help='Spread orders and expenses over this many days')
+        parser.add_argument('--end-date', type=date.fromisoformat, default=None,
+                            help='Last day of the data (YYYY-MM-DD), defaults to today; fix it to get the '
+                                 'same data on any day')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--skip-rollups', action='store_true',
+                            help="Don't rebuild the rollup tables afterwards (run their commands yourself)")
+
+    def handle(self, *args, **options):
+        if options['customers'] < 1 and options['orders'] > 0:
+            raise CommandError('Orders need at least one customer')
+        if options['batch_size'] < 1 or options['days'] < 1:
+            raise CommandError('--batch-size and --days must be at least 1')
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.end_date = options['end_date'] or timezone.localdate()
+        self.days = options['days']
+        began = time.monotonic()
+
+        # Rollups are rebuilt once at the end instead of batch by batch
+        with rollups.suppressed():
+            products = self.create_products(options['products'])
+            customer_ids = self.create_customers(options['customers'])
+            order_ids = self.create_orders(options['orders'], customer_ids, products, options['max_items'])
+            self.create_expenses(options['expenses'], order_ids)
+        self.stdout.write(f'Data written in {time.monotonic() - began:.1f}s')
+
+        if not options['skip_rollups']:
+            call_command('rebuild_customer_stats', stdout=self.stdout)
+            call_command('rebuild_cohorts', stdout=self.stdout)
+            call_command('rebuild_expense_terms', stdout=self.stdout)
+            call_command('backfill_daily_summary', stdout=self.stdout)
+            call_command('rebuild_search_index', stdout=self.stdout)
+            dashboard_metrics.invalidate([
+                dashboard_metrics.COUNTS, dashboard_metrics.RECENT_ORDERS, dashboard_metrics.TOP_CUSTOMERS,
+                dashboard_metrics.month_revenue_key(timezone.now()),
+            ])
+            analytics.invalidate(self.end_date - timedelta(days=offset) for offset in range(-1, self.days + 1))
+        self.stdout.write(self.style.SUCCESS(f'Seeded synthetic data in {time.monotonic() - began:.1f}s'))
+
+    def batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield range(start, min(start + self.batch_size, total))
+
+    def random_datetime(self):
+        day = self.end_date - timedelta(days=self.random.randrange(self.days))
+        return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+    def create_products(self, count):
+        existing = set(Product.objects.filter(sku__startswith='SYN-').values_list('sku', flat=True))
+        products = []
+        for index in range(count):
+            cost = Decimal(self.random.randrange(1500, 6000, 100))
+            products.append(Product(
+                sku=f'SYN-{index:05d}', name=f'Synthetic Tie {index}', cost_price=cost,
+                unit_price=cost * Decimal(self.random.choice(['1.8', '2', '2.5'])),
+            ))
+        Product.objects.bulk_create([product for product in products if product.sku not in existing])
+        return list(Product.objects.filter(sku__in=[product.sku for product in products]).order_by('sku'))
+
+    def create_customers(self, count):
+        ids = []
+        for batch in self.batches(count):
+            customers = []
+            for _ in batch:
+                first_name, last_name = self.random.choice(FIRST_NAMES), self.random.choice(LAST_NAMES)
+                customers.append(Customer(
+                    first_name=first_name,
+                    last_name=last_name,
+                    email=f'{first_name}.{last_name}{self.random.randrange(1000)}@example.com'.lower(),
+                    phone=f'0{self.random.choice("789")}0{self.random.randrange(10 ** 8):08d}',
+                    address=f'{self.random.randrange(1, 200)} {self.random.choice(STREETS)}',
+                ))
+            with transaction.atomic():
+                ids += [customer.pk for customer in Customer.objects.bulk_create(customers)]
+            self.stdout.write(f'{len(ids)} customers')
+        return ids
+
+    def create_orders(self, count, customer_ids, products, max_items):
+        # A few customers buy often and most buy once or twice, like real repeat business
+        cum_weights = list(accumulate(1 / (rank + 1) ** 0.8 for rank in range(len(customer_ids))))
+        statuses, status_weights = zip(*STATUS_WEIGHTS.items())
+        delivery_types, delivery_weights = zip(*DELIVERY_WEIGHTS.items())
+        ids = []
+        for batch in self.batches(count):
+            orders, items = [], []
+            buyers = self.random.choices(customer_ids, cum_weights=cum_weights, k=len(batch))
+            numbers = Order.allocate_order_numbers(len(batch))
+            for buyer, number in zip(buyers, numbers):
+                order_items = [
+                    (self.random.choice(products), self.random.randint(1, 3))
+                    for _ in range(self.random.randint(0, max_items) if products else 0)
+                ]
+                if order_items:
+                    ties = sum(quantity for _, quantity in order_items)
+                    total_amount = sum(product.unit_price * quantity for product, quantity in order_items)
+                    total_cost = sum(product.cost_price * quantity for product, quantity in order_items)
+                else:
+                    ties = self.random.randint(1, 5)
+                    total_amount = Decimal(self.random.randrange(8000, 15000, 500)) * ties
+                    total_cost = Decimal(self.random.randrange(2000, 6000, 100)) * ties
+                delivery_type = self.random.choices(delivery_types, weights=delivery_weights)[0]
+                delivery_fee = Decimal(self.random.randrange(1500, 5000, 500))
+                business_share = {'customer': Decimal('0'), 'business': delivery_fee, 'shared': delivery_fee / 2}[delivery_type]
+                order = Order(
+                    order_number=number,
+                    customer_id=buyer,
+                    status=self.random.choices(statuses, weights=status_weights)[0],
+                    number_of_ties=ties,
+                    cost_price_per_tie=(total_cost / ties).quantize(Decimal('0.01')),
+                    total_amount=total_amount,
+                    total_cost=total_cost,
+                    delivery_fee=delivery_fee,
+                    delivery_payment_type=delivery_type,
+                    customer_delivery_amount=delivery_fee - business_share,
+                    business_delivery_amount=business_share,
+                    packaging_boxes=self.random.randint(0, 2),
+                    created_at=self.random_datetime(),
+                )
+                orders.append(order)
+                items.append(order_items)
+            with transaction.atomic():
+                Order.objects.bulk_create(orders)
+                OrderItem.objects.bulk_create([
+                    OrderItem(order=order, product=product, quantity=quantity)
+                    for order, order_items in zip(orders, items)
+                    for product, quantity in order_items
+                ])
+            ids += [order.pk for order in orders]
+            self.stdout.write(f'{len(ids)} orders')
+        return ids
+
+    def create_expenses(self, count, order_ids):
+        created = 0
+        for batch in self.batches(count):
+            expenses = []
+            for _ in batch:
+                expense_type = self.random.choice(EXPENSE_TYPES)
+                expenses.append(Expense(
+                    description=f'{expense_type.title()} {self.random.randrange(1, 500)}',
+                    amount=Decimal(self.random.randrange(500, 50000, 250)),
+                    expense_type=expense_type,
+                    # Roughly one in five expenses belongs to a specific order
+                    order_id=self.random.choice(order_ids) if order_ids and self.random.random() < 0.2 else None,
+                    date=self.random_datetime() + timedelta(hours=self.random.randrange(8, 20)),
+                ))
+            with transaction.atomic():
+                Expense.objects.bulk_create(expenses)
+            created += len(expenses)
+            self.stdout.write(f'{created} expenses')
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_alter_expense_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='core.customer')),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('ties_bought', models.PositiveIntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('customer_delivery_total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('business_delivery_total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('delivery_fee_total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('items_cost_total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('lifetime_value', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('first_order_at', models.DateTimeField(blank=True, null=True)),
+                ('latest_order_at', models.DateTimeField(blank=True, null=True)),
+                ('latest_order_number', models.CharField(blank=True, max_length=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'customer stats',
+                'indexes': [models.Index(fields=['lifetime_value'], name='core_custom_lifetim_3ec22e_idx'), models.Index(fields=['ties_bought'], name='core_custom_ties_bo_496808_idx'), models.Index(fields=['first_order_at'], name='core_custom_first_o_916df5_idx')],
+            },
+        ),
+    ]
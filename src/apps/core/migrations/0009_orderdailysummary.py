@@ -0,0 +1,68 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:19
+
+from django.db import migrations, models
+from django.db.models import Case, Count, DecimalField, F, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def summarize_existing_orders(apps, schema_editor):
+    Order = apps.get_model('core', 'Order')
+    OrderDailySummary = apps.get_model('core', 'OrderDailySummary')
+    money = DecimalField(max_digits=14, decimal_places=2)
+    delivery_cost = Case(
+        When(delivery_payment_type='business', then=F('delivery_fee')),
+        When(delivery_payment_type='shared', then=F('business_delivery_amount')),
+        default=Value(0),
+        output_field=money,
+    )
+    rows = (
+        Order.objects.annotate(day=TruncDate('created_at', tzinfo=timezone.get_current_timezone()))
+        .values('day')
+        .annotate(
+            order_count=Count('id'),
+            ties_sold=Sum('number_of_ties'),
+            revenue=Sum('total_amount'),
+            cost=Sum('total_cost'),
+            profit=Sum(F('total_amount') - F('total_cost') - delivery_cost, output_field=money),
+            delivery_fees=Sum('delivery_fee'),
+            customer_delivery=Sum('customer_delivery_amount'),
+            business_delivery=Sum('business_delivery_amount'),
+            packaging_boxes=Sum('packaging_boxes'),
+        )
+        .order_by()
+    )
+    OrderDailySummary.objects.bulk_create(
+        [OrderDailySummary(date=row.pop('day'), **row) for row in rows.iterator()], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderDailySummary',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('ties_sold', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('profit', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('delivery_fees', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('customer_delivery', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('business_delivery', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('packaging_boxes', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'order daily summaries',
+                'ordering': ['date'],
+            },
+        ),
+        migrations.RunPython(summarize_existing_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_orderdailysummary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['date'], name='core_expens_date_d957f6_idx'),
+        ),
+    ]
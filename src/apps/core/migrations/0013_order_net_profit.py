@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:45
+
+from django.db import migrations, models
+from django.db.models import Case, DecimalField, F, Value, When
+
+
+def fill_profit(apps, schema_editor):
+    # Same rules as Order.update_profit(), in one UPDATE
+    Order = apps.get_model('core', 'Order')
+    money = DecimalField(max_digits=12, decimal_places=2)
+    delivery_cost = Case(
+        When(delivery_payment_type='business', then=F('delivery_fee')),
+        When(delivery_payment_type='shared', then=F('business_delivery_amount')),
+        default=Value(0),
+        output_field=money,
+    )
+    Order.objects.update(
+        gross_profit=F('total_amount') - F('total_cost'),
+        net_profit=F('total_amount') - F('total_cost') - delivery_cost,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='net_profit',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.RunPython(fill_profit, migrations.RunPython.noop),
+    ]
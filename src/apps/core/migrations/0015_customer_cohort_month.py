@@ -0,0 +1,62 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:58
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+
+def build_cohorts(apps, schema_editor):
+    Order = apps.get_model('core', 'Order')
+    CustomerCohortMonth = apps.get_model('core', 'CustomerCohortMonth')
+    tz = timezone.get_current_timezone()
+    rows = (
+        Order.objects.filter(customer__stats__first_order_at__isnull=False)
+        .annotate(
+            cohort=TruncMonth('customer__stats__first_order_at', tzinfo=tz),
+            month=TruncMonth('created_at', tzinfo=tz),
+        )
+        .values('cohort', 'month')
+        .annotate(
+            customers=Count('customer', distinct=True),
+            orders=Count('id'),
+            value=Sum(F('total_amount') + F('customer_delivery_amount')),
+        )
+        .order_by()
+    )
+    CustomerCohortMonth.objects.bulk_create([
+        CustomerCohortMonth(
+            cohort=timezone.localtime(row.pop('cohort')).date(), month=timezone.localtime(row.pop('month')).date(), **row
+        )
+        for row in rows.iterator()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_order_customer_created_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerCohortMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cohort', models.DateField()),
+                ('month', models.DateField()),
+                ('customers', models.PositiveIntegerField(default=0)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['cohort', 'month'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='customercohortmonth',
+            constraint=models.UniqueConstraint(fields=('cohort', 'month'), name='unique_cohort_month'),
+        ),
+        migrations.RunPython(build_cohorts, migrations.RunPython.noop),
+    ]
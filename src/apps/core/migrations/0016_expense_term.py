@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:01
+
+from django.db import migrations, models
+
+
+def collect_existing_terms(apps, schema_editor):
+    Expense = apps.get_model('core', 'Expense')
+    ExpenseTerm = apps.get_model('core', 'ExpenseTerm')
+    usages = {}
+    for expense_type, description, used_at in Expense.objects.values_list('expense_type', 'description', 'date').iterator():
+        for kind, value in (('type', expense_type), ('description', description)):
+            value = ' '.join((value or '').split())
+            if not value:
+                continue
+            usage = usages.setdefault((kind, value.lower()), [value, 0, None])
+            usage[1] += 1
+            if used_at and (usage[2] is None or used_at > usage[2]):
+                usage[2] = used_at
+    ExpenseTerm.objects.bulk_create([
+        ExpenseTerm(kind=kind, value=value, normalized=normalized, usage_count=uses, last_used_at=used_at)
+        for (kind, normalized), (value, uses, used_at) in usages.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_customer_cohort_month'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpenseTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('type', 'Expense type'), ('description', 'Description')], max_length=20)),
+                ('value', models.CharField(max_length=200)),
+                ('normalized', models.CharField(max_length=200)),
+                ('usage_count', models.PositiveIntegerField(default=0)),
+                ('last_used_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', '-usage_count'], name='core_expens_kind_4e2da9_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='expenseterm',
+            constraint=models.UniqueConstraint(fields=('kind', 'normalized'), name='unique_expense_term'),
+        ),
+        migrations.RunPython(collect_existing_terms, migrations.RunPython.noop),
+    ]
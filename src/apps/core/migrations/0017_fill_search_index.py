@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+def fill_search_index(apps, schema_editor):
+    # Databases that existed before 0011 would otherwise search an empty index
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from apps.core import search
+
+    search.rebuild(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_expense_term'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_search_index, migrations.RunPython.noop),
+    ]
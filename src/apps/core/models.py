@@ -1,6 +1,39 @@
-from django.db import models
-from django.db.models import Index
-from datetime import datetime
+from django.db import IntegrityError, models, transaction
+from django.db.models import BigIntegerField, Case, Count, DecimalField, ExpressionWrapper, F, Index, Max, Min, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest, TruncDate, TruncMonth
+from django.db.models.base import DEFERRED
+from django.utils import timezone
+from datetime import datetime, time, timedelta
+from . import rollups
+
+class LoadedValuesMixin:
+    """Remembers the values a row was loaded with, so signal handlers can see what changed."""
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, (value for value in values if value is not DEFERRED)))
+        return instance
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # The signal handlers have seen this save, so the next one is compared with what it wrote
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            deferred = self.get_deferred_fields()
+            self.remember_values(*(field.attname for field in self._meta.concrete_fields if field.attname not in deferred))
+        else:
+            self.remember_values(*(self._meta.get_field(name).attname for name in update_fields))
+    
+    def loaded_value(self, attname):
+        return getattr(self, '_loaded_values', {}).get(attname)
+    
+    def has_loaded_values(self):
+        return hasattr(self, '_loaded_values')
+    
+    def remember_values(self, *attnames):
+        """Treat the current values of ``attnames`` as the loaded ones."""
+        self._loaded_values = {**getattr(self, '_loaded_values', {}), **{attname: getattr(self, attname) for attname in attnames}}
 
 class Product(models.Model):
     name = models.CharField(max_length=200, blank=True)
@@ -10,6 +43,8 @@ class Product(models.Model):
     cost_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
     image = models.ImageField(upload_to='ties/', blank=True, null=True)
+    # Content-hash name, dimensions and thumbnail names written by images.process()
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     sold = models.BooleanField(default=False, help_text="Mark as sold when tie is purchased")
     created_at = models.DateTimeField(auto_now_add=True, null=True)
     
@@ -25,38 +60,68 @@ class Product(models.Model):
     @property
     def availability_status(self):
         return "Sold" if self.sold else "Available"
+    
+    def thumbnail_url(self, size='small', fmt='webp'):
+        """URL of a thumbnail, or of the original upload while it hasn't been processed yet."""
+        if not self.image:
+            return ''
+        if self.image_variants.get('original') != self.image.name:
+            return self.image.url
+        return self.image.storage.url(self.image_variants['thumbnails'][size][fmt])
 
-class Customer(models.Model):
+class CustomerQuerySet(models.QuerySet):
+    def with_order_stats(self):
+        """Annotate order totals per customer in one grouped query, so lists can sort and paginate in SQL."""
+        money = DecimalField(max_digits=12, decimal_places=2)
+        zero = Value(0, output_field=money)
+        return self.annotate(
+            order_count=Count('order'),
+            ties_bought=Coalesce(Sum('order__number_of_ties'), 0),
+            first_order_at=Min('order__created_at'),
+            lifetime_value=Coalesce(Sum('order__total_amount'), zero) + Coalesce(Sum('order__customer_delivery_amount'), zero),
+        )
+
+class Customer(LoadedValuesMixin, models.Model):
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
     email = models.EmailField()
     phone = models.CharField(max_length=20)
     address = models.TextField()
     
+    objects = CustomerQuerySet.as_manager()
+    
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
     
+    def _stats(self):
+        try:
+            return self.stats
+        except CustomerStats.DoesNotExist:
+            # Not built yet (e.g. before the first rebuild_customer_stats run)
+            stats = CustomerStats.refresh([self.pk])[0]
+            self.stats = stats
+            return stats
+    
     def total_orders(self):
-        return self.order_set.count()
+        return self._stats().order_count
     
     def total_ties_bought(self):
-        return sum(order.number_of_ties for order in self.order_set.all())
+        return self._stats().ties_bought
     
     def total_cost_of_ties(self):
-        return sum(order.total_amount for order in self.order_set.all())
+        return self._stats().total_amount
     
     def total_delivery_paid_by_customer(self):
-        return sum(order.customer_delivery_amount for order in self.order_set.all())
+        return self._stats().customer_delivery_total
     
     def total_delivery_paid_by_business(self):
-        return sum(order.business_delivery_amount for order in self.order_set.all())
+        return self._stats().business_delivery_total
     
     def total_delivery_fees(self):
-        return sum(order.delivery_fee for order in self.order_set.all())
+        return self._stats().delivery_fee_total
     
     def total_amount_paid(self):
-        base_amount = self.total_cost_of_ties()
-        return base_amount + self.total_delivery_paid_by_customer()
+        return self._stats().lifetime_value
     
     def selling_price_per_tie(self):
         ties_count = self.total_ties_bought()
@@ -68,16 +133,13 @@ class Customer(models.Model):
         ties_count = self.total_ties_bought()
         if ties_count == 0:
             return 0
-        total_cost = sum(item.product.cost_price * item.quantity for order in self.order_set.all() for item in order.orderitem_set.all())
-        return total_cost / ties_count
+        return self._stats().items_cost_total / ties_count
     
     def first_order_date(self):
-        first_order = self.order_set.order_by('created_at').first()
-        return first_order.created_at if first_order else None
+        return self._stats().first_order_at
     
     def latest_order_number(self):
-        latest_order = self.order_set.order_by('-created_at').first()
-        return latest_order.order_number if latest_order else 'No orders'
+        return self._stats().latest_order_number or 'No orders'
     
     def customer_lifetime_value(self):
         return self.total_amount_paid()
@@ -88,14 +150,29 @@ class Customer(models.Model):
         indexes = [Index(fields=['phone']), Index(fields=['first_name', 'last_name'])]
     
     def profit_made(self):
-        revenue = self.total_cost_of_ties()
-        total_cost_price = sum(item.product.cost_price * item.quantity for order in self.order_set.all() for item in order.orderitem_set.all())
-        business_expenses = self.total_delivery_paid_by_business()
-        return revenue - total_cost_price - business_expenses
+        stats = self._stats()
+        return stats.total_amount - stats.items_cost_total - stats.business_delivery_total
     
 
 
-class Order(models.Model):
+class OrderQuerySet(models.QuerySet):
+    # Bulk writes skip save(), so fill in the stored profit columns here instead
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.update_profit()
+        return super().bulk_create(objs, *args, **kwargs)
+    
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        if Order.PROFIT_INPUTS.intersection(fields):
+            for obj in objs:
+                obj.update_profit()
+            fields = list(dict.fromkeys([*fields, *Order.PROFIT_FIELDS]))
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+class Order(LoadedValuesMixin, models.Model):
     STATUS_CHOICES = [
         ('new', 'New Order'),
         ('processing', 'Processing'),
@@ -104,6 +181,14 @@ class Order(models.Model):
         ('returned', 'Returned'),
     ]
     
+    # status -> the statuses an order may move to it from
+    STATUS_TRANSITIONS = {
+        'processing': {'new'},
+        'shipped': {'new', 'processing'},
+        'delivered': {'shipped'},
+        'returned': {'shipped', 'delivered'},
+    }
+    
     DELIVERY_CHOICES = [
         ('customer', 'Customer Paid'),
         ('business', 'Business Paid'),
@@ -118,6 +203,7 @@ class Order(models.Model):
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     gross_profit = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    net_profit = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     delivery_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     delivery_payment_type = models.CharField(max_length=10, choices=DELIVERY_CHOICES, default='customer')
     customer_delivery_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
@@ -126,29 +212,49 @@ class Order(models.Model):
     created_at = models.DateTimeField()
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = OrderQuerySet.as_manager()
+    
+    # The stored profit columns and the fields they are derived from
+    PROFIT_FIELDS = ('gross_profit', 'net_profit')
+    PROFIT_INPUTS = {'total_amount', 'total_cost', 'delivery_fee', 'delivery_payment_type', 'business_delivery_amount'}
+    
     def save(self, *args, **kwargs):
         if not self.order_number:
-            # Get all existing order numbers and find the highest numeric one
-            existing_orders = Order.objects.exclude(id=self.id).values_list('order_number', flat=True)
-            max_num = 0
-            for order_num in existing_orders:
-                try:
-                    num = int(order_num)
-                    if num > max_num:
-                        max_num = num
-                except (ValueError, TypeError):
-                    continue
-            
-            new_num = str(max_num + 1).zfill(5)
-            self.order_number = new_num
+            self.order_number = Order.allocate_order_numbers(1)[0]
+        self.update_profit()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and self.PROFIT_INPUTS.intersection(update_fields):
+            kwargs['update_fields'] = {*update_fields, *self.PROFIT_FIELDS}
         super().save(*args, **kwargs)
     
+    def update_profit(self):
+        """Set gross_profit (amount less cost) and net_profit (less the business's delivery share)."""
+        self.gross_profit = self.total_amount - self.total_cost
+        self.net_profit = self.calculate_profit()
+    
+    @staticmethod
+    def format_order_number(value):
+        return str(value).zfill(5)
+    
+    @classmethod
+    def allocate_order_numbers(cls, count):
+        """Reserve ``count`` consecutive order numbers, e.g. for bulk_create."""
+        return [cls.format_order_number(value) for value in Sequence.reserve(Sequence.ORDER_NUMBER, count)]
+    
+    @classmethod
+    def highest_order_number(cls):
+        # Only purely numeric order numbers take part in the sequence
+        return cls.objects.filter(order_number__regex=r'^[0-9]+$').aggregate(
+            highest=Max(Cast('order_number', BigIntegerField()))
+        )['highest'] or 0
+    
 
     
     class Meta:
         indexes = [
             Index(fields=['created_at']),
-            Index(fields=['customer']),
+            # A customer's order history, newest first (also serves plain customer lookups)
+            Index(fields=['customer', 'created_at']),
             Index(fields=['status']),
             Index(fields=['order_number'])
         ]
@@ -157,11 +263,36 @@ class Order(models.Model):
         return f"Order {self.order_number} - {self.customer}"
     
     def calculate_total(self):
-        self.total_amount = sum(item.subtotal() for item in self.orderitem_set.all())
-        self.total_cost = sum(item.cost_total() for item in self.orderitem_set.all())
-        self.gross_profit = self.calculate_profit()
+        self.total_amount, self.total_cost = Order.item_totals([self.pk]).get(self.pk, (0, 0))
+        self.update_profit()
         return self.total_amount
     
+    @classmethod
+    def item_totals(cls, order_ids):
+        """``{order_id: (total_amount, total_cost)}`` of the orders' items, in one query joining Product."""
+        money = DecimalField(max_digits=12, decimal_places=2)
+        rows = OrderItem.objects.filter(order_id__in=order_ids).values('order_id').annotate(
+            amount=Sum(F('quantity') * F('product__unit_price'), output_field=money),
+            cost=Sum(F('quantity') * F('product__cost_price'), output_field=money),
+        ).order_by()
+        return {row['order_id']: (row['amount'], row['cost']) for row in rows}
+    
+    @classmethod
+    def recalculate_totals(cls, order_ids):
+        """
+        Recompute total_amount, total_cost and the profit columns from the items
+        of the given orders, saving only the ones that changed. Returns the orders.
+        """
+        totals = cls.item_totals(order_ids)
+        orders = list(cls.objects.filter(pk__in=order_ids))
+        for order in orders:
+            previous = (order.total_amount, order.total_cost, order.gross_profit, order.net_profit)
+            order.total_amount, order.total_cost = totals.get(order.pk, (0, 0))
+            order.update_profit()
+            if (order.total_amount, order.total_cost, order.gross_profit, order.net_profit) != previous:
+                order.save(update_fields=['total_amount', 'total_cost', 'updated_at'])
+        return orders
+    
     def calculate_profit(self):
         base_profit = self.total_amount - self.total_cost
         
@@ -177,16 +308,44 @@ class Order(models.Model):
     
     def profit_margin_percent(self):
         if self.total_amount > 0:
-            return (self.calculate_profit() / self.total_amount) * 100
+            return (self.net_profit / self.total_amount) * 100
         return 0
     
 
 
-class OrderItem(models.Model):
+def order_profit_expression():
+    """SQL equivalent of Order.calculate_profit(), for checking the stored net_profit column."""
+    money = DecimalField(max_digits=12, decimal_places=2)
+    delivery_cost = Case(
+        When(delivery_payment_type='business', then=F('delivery_fee')),
+        When(delivery_payment_type='shared', then=F('business_delivery_amount')),
+        default=Value(0),
+        output_field=money,
+    )
+    return ExpressionWrapper(F('total_amount') - F('total_cost') - delivery_cost, output_field=money)
+
+
+class OrderItemQuerySet(models.QuerySet):
+    # Bulk writes send no signals, so queue the order totals here instead
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        rollups.schedule('order_totals', {obj.order_id for obj in objs})
+        return objs
+    
+    def bulk_update(self, objs, *args, **kwargs):
+        objs = list(objs)
+        updated = super().bulk_update(objs, *args, **kwargs)
+        rollups.schedule('order_totals', {obj.order_id for obj in objs})
+        return updated
+
+class OrderItem(LoadedValuesMixin, models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
     
+    objects = OrderItemQuerySet.as_manager()
+    
     def subtotal(self):
         return self.quantity * self.product.unit_price
     
@@ -199,12 +358,412 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"{self.product.name} x {self.quantity}"
 
-class Expense(models.Model):
+class Expense(LoadedValuesMixin, models.Model):
     description = models.CharField(max_length=200)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     expense_type = models.CharField(max_length=50)
     order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True)
     date = models.DateTimeField()
     
+    class Meta:
+        indexes = [Index(fields=['date'])]
+    
+    def __str__(self):
+        return f"{self.description} - ${self.amount}"
+
+
+class ExpenseTerm(models.Model):
+    """
+    The distinct expense types and descriptions, with how often and when they
+    were last used, for autocomplete. Kept up to date by the signals in signals.py.
+    """
+    TYPE = 'type'
+    DESCRIPTION = 'description'
+    KIND_CHOICES = [(TYPE, 'Expense type'), (DESCRIPTION, 'Description')]
+    # The Expense field each kind comes from
+    SOURCES = {TYPE: 'expense_type', DESCRIPTION: 'description'}
+    
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    value = models.CharField(max_length=200)
+    # Lower case with single spaces; terms are matched and counted on this
+    normalized = models.CharField(max_length=200)
+    usage_count = models.PositiveIntegerField(default=0)
+    # Only breaks ties in the ranking, so it is not moved back when a use is removed
+    last_used_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['kind', 'normalized'], name='unique_expense_term')]
+        indexes = [Index(fields=['kind', '-usage_count'])]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.value}"
+    
+    @staticmethod
+    def normalize(value):
+        return ' '.join((value or '').split()).lower()
+    
+    @classmethod
+    def usages(cls, expenses):
+        """
+        {(kind, normalized): [value, uses, last used]} for rows of
+        (expense_type, description, date).
+        """
+        usages = {}
+        for expense_type, description, used_at in expenses:
+            for kind, value in ((cls.TYPE, expense_type), (cls.DESCRIPTION, description)):
+                normalized = cls.normalize(value)
+                if not normalized:
+                    continue
+                usage = usages.setdefault((kind, normalized), [' '.join(value.split()), 0, None])
+                usage[1] += 1
+                if used_at and (usage[2] is None or used_at > usage[2]):
+                    usage[2] = used_at
+        return usages
+    
+    @classmethod
+    def record(cls, expenses, delta=1):
+        """
+        Count the rows of (expense_type, description, date) as used (``delta=1``)
+        or no longer used (``delta=-1``), with one UPDATE per distinct term.
+        """
+        for (kind, normalized), (value, uses, used_at) in cls.usages(expenses).items():
+            terms = cls.objects.filter(kind=kind, normalized=normalized)
+            changes = {'usage_count': Greatest(F('usage_count') + uses * delta, Value(0))}
+            if delta > 0:
+                changes['value'] = value
+                if used_at:
+                    changes['last_used_at'] = Coalesce(Greatest('last_used_at', Value(used_at)), Value(used_at))
+            if terms.update(**changes) or delta < 0:
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(kind=kind, value=value, normalized=normalized, usage_count=uses, last_used_at=used_at)
+            except IntegrityError:
+                # Another request added the term first
+                terms.update(**changes)
+        if delta < 0:
+            cls.objects.filter(usage_count=0).delete()
+    
+    @classmethod
+    def suggest(cls, kind, prefix='', limit=10):
+        """The most used terms of ``kind`` starting with ``prefix``, read with a range scan of the unique index."""
+        terms = cls.objects.filter(kind=kind)
+        prefix = cls.normalize(prefix)
+        if prefix:
+            terms = terms.filter(normalized__gte=prefix, normalized__lt=prefix + '\U0010ffff')
+        return list(terms.order_by('-usage_count', '-last_used_at').values('value', 'usage_count', 'last_used_at')[:limit])
+
+
+class CustomerStats(models.Model):
+    """Per-customer order totals, kept up to date by the signals in signals.py."""
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    order_count = models.PositiveIntegerField(default=0)
+    ties_bought = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    customer_delivery_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    business_delivery_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    delivery_fee_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    items_cost_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    lifetime_value = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    first_order_at = models.DateTimeField(null=True, blank=True)
+    latest_order_at = models.DateTimeField(null=True, blank=True)
+    latest_order_number = models.CharField(max_length=20, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    STAT_FIELDS = [
+        'order_count', 'ties_bought', 'total_amount', 'customer_delivery_total', 'business_delivery_total',
+        'delivery_fee_total', 'items_cost_total', 'lifetime_value', 'first_order_at', 'latest_order_at',
+        'latest_order_number',
+    ]
+    
+    class Meta:
+        verbose_name_plural = 'customer stats'
+        indexes = [
+            Index(fields=['lifetime_value']),
+            Index(fields=['ties_bought']),
+            Index(fields=['first_order_at']),
+        ]
+    
+    def __str__(self):
+        return f"Stats for customer {self.customer_id}"
+    
+    @classmethod
+    def compute(cls, customer_ids):
+        """Build (unsaved) stats rows for the given customers with a single query."""
+        money = DecimalField(max_digits=12, decimal_places=2)
+        zero = Value(0, output_field=money)
+        items_cost = (
+            OrderItem.objects.filter(order__customer=OuterRef('pk'))
+            .order_by()
+            .values('order__customer')
+            .annotate(total=Sum(ExpressionWrapper(F('quantity') * F('product__cost_price'), output_field=money)))
+            .values('total')
+        )
+        latest_order = Order.objects.filter(customer=OuterRef('pk')).order_by('-created_at', '-id').values('order_number')[:1]
+        rows = (
+            Customer.objects.filter(pk__in=customer_ids)
+            .order_by()
+            .annotate(
+                stat_order_count=Count('order'),
+                stat_ties_bought=Coalesce(Sum('order__number_of_ties'), 0),
+                stat_total_amount=Coalesce(Sum('order__total_amount'), zero),
+                stat_customer_delivery_total=Coalesce(Sum('order__customer_delivery_amount'), zero),
+                stat_business_delivery_total=Coalesce(Sum('order__business_delivery_amount'), zero),
+                stat_delivery_fee_total=Coalesce(Sum('order__delivery_fee'), zero),
+                stat_first_order_at=Min('order__created_at'),
+                stat_latest_order_at=Max('order__created_at'),
+                stat_items_cost_total=Coalesce(Subquery(items_cost, output_field=money), zero),
+                stat_latest_order_number=Coalesce(Subquery(latest_order), Value('')),
+            )
+            .values('pk', *[f'stat_{name}' for name in cls.STAT_FIELDS if name != 'lifetime_value'])
+        )
+        stats = []
+        for row in rows:
+            values = {name: row[f'stat_{name}'] for name in cls.STAT_FIELDS if name != 'lifetime_value'}
+            values['lifetime_value'] = values['total_amount'] + values['customer_delivery_total']
+            stats.append(cls(customer_id=row['pk'], **values))
+        return stats
+    
+    @classmethod
+    def refresh(cls, customer_ids):
+        """Recompute and store the stats rows for the given customers."""
+        # In a transaction so the reads come from default even on replica-routed pages
+        with transaction.atomic():
+            stats = cls.compute(customer_ids)
+            cls.store(stats)
+        return stats
+    
+    @classmethod
+    def store(cls, stats):
+        if stats:
+            cls.objects.bulk_create(
+                stats,
+                update_conflicts=True,
+                unique_fields=['customer'],
+                update_fields=cls.STAT_FIELDS + ['updated_at'],
+            )
+    
+    def differences(self, other):
+        return [name for name in self.STAT_FIELDS if getattr(self, name) != getattr(other, name)]
+
+
+class Sequence(models.Model):
+    """Named counters handed out atomically, e.g. for order numbers."""
+    ORDER_NUMBER = 'order_number'
+    
+    name = models.CharField(max_length=50, primary_key=True)
+    last_value = models.PositiveBigIntegerField(default=0)
+    
     def __str__(self):
-        return f"{self.description} - ${self.amount}"
\ No newline at end of file
+        return f"{self.name} = {self.last_value}"
+    
+    @classmethod
+    def initial_value(cls, name):
+        if name == cls.ORDER_NUMBER:
+            return Order.highest_order_number()
+        return 0
+    
+    @classmethod
+    def reserve(cls, name, count=1):
+        """Atomically reserve the next ``count`` values and return them as a range."""
+        if count < 1:
+            raise ValueError('count must be at least 1')
+        with transaction.atomic():
+            # The UPDATE takes the write lock, so concurrent callers queue up
+            # here instead of reading the same last value
+            if not cls.objects.filter(name=name).update(last_value=F('last_value') + count):
+                cls.objects.get_or_create(name=name, defaults={'last_value': cls.initial_value(name)})
+                cls.objects.filter(name=name).update(last_value=F('last_value') + count)
+            last_value = cls.objects.filter(name=name).values_list('last_value', flat=True).get()
+        return range(last_value - count + 1, last_value + 1)
+
+
+class OrderDailySummaryQuerySet(models.QuerySet):
+    def between(self, start=None, end=None):
+        """Days from ``start`` to ``end`` inclusive; either bound may be omitted."""
+        summaries = self
+        if start:
+            summaries = summaries.filter(date__gte=start)
+        if end:
+            summaries = summaries.filter(date__lte=end)
+        return summaries
+    
+    def totals(self):
+        totals = self.aggregate(**{name: Sum(name) for name in self.model.TOTAL_FIELDS})
+        return {name: value or 0 for name, value in totals.items()}
+    
+    def monthly(self):
+        """One row per calendar month with the summed totals, oldest first."""
+        return (
+            self.annotate(month=TruncMonth('date'))
+            .values('month')
+            .annotate(**{name: Sum(name) for name in self.model.TOTAL_FIELDS})
+            .order_by('month')
+        )
+
+
+class OrderDailySummary(models.Model):
+    """Order totals per calendar day (in TIME_ZONE), kept up to date by the signals in signals.py."""
+    date = models.DateField(primary_key=True)
+    order_count = models.PositiveIntegerField(default=0)
+    ties_sold = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    profit = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    delivery_fees = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    customer_delivery = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    business_delivery = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    packaging_boxes = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    TOTAL_FIELDS = [
+        'order_count', 'ties_sold', 'revenue', 'cost', 'profit', 'delivery_fees', 'customer_delivery',
+        'business_delivery', 'packaging_boxes',
+    ]
+    
+    objects = OrderDailySummaryQuerySet.as_manager()
+    
+    class Meta:
+        ordering = ['date']
+        verbose_name_plural = 'order daily summaries'
+    
+    def __str__(self):
+        return f"Orders on {self.date}"
+    
+    @staticmethod
+    def day_bounds(day):
+        """Aware datetimes [start, end) covering ``day`` in the current time zone."""
+        return (
+            timezone.make_aware(datetime.combine(day, time.min)),
+            timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min)),
+        )
+    
+    @staticmethod
+    def day_of(value):
+        return timezone.localtime(value).date()
+    
+    @classmethod
+    def compute(cls, days):
+        """Build (unsaved) summary rows for the given days with a single grouped query."""
+        days = sorted(set(days))
+        if not days:
+            return []
+        # Consecutive days collapse into one created_at range so the index can be used
+        ranges = []
+        for day in days:
+            start, end = cls.day_bounds(day)
+            if ranges and ranges[-1][1] == start:
+                ranges[-1][1] = end
+            else:
+                ranges.append([start, end])
+        in_range = Q()
+        for start, end in ranges:
+            in_range |= Q(created_at__gte=start, created_at__lt=end)
+        rows = (
+            Order.objects.filter(in_range)
+            .annotate(day=TruncDate('created_at', tzinfo=timezone.get_current_timezone()))
+            .values('day')
+            .annotate(
+                order_count=Count('id'),
+                ties_sold=Sum('number_of_ties'),
+                revenue=Sum('total_amount'),
+                cost=Sum('total_cost'),
+                profit=Sum('net_profit'),
+                delivery_fees=Sum('delivery_fee'),
+                customer_delivery=Sum('customer_delivery_amount'),
+                business_delivery=Sum('business_delivery_amount'),
+                packaging_boxes=Sum('packaging_boxes'),
+            )
+            .order_by()
+        )
+        return [cls(date=row.pop('day'), **row) for row in rows]
+    
+    @classmethod
+    def refresh(cls, days):
+        """Recompute the summary rows for the given days, dropping days that no longer have orders."""
+        summaries = cls.compute(days)
+        if summaries:
+            cls.objects.bulk_create(
+                summaries,
+                update_conflicts=True,
+                unique_fields=['date'],
+                update_fields=cls.TOTAL_FIELDS + ['updated_at'],
+            )
+        cls.objects.filter(date__in=set(days) - {summary.date for summary in summaries}).delete()
+        return summaries
+
+
+class CustomerCohortMonth(models.Model):
+    """
+    What the customers acquired in ``cohort`` (the month of their first order)
+    bought in ``month``, kept up to date by the rollups after every change to
+    their stats. Both are the first day of a month in TIME_ZONE.
+    """
+    cohort = models.DateField()
+    month = models.DateField()
+    customers = models.PositiveIntegerField(default=0)
+    orders = models.PositiveIntegerField(default=0)
+    # Order amount plus the customer's delivery share, as in lifetime_value
+    value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    TOTAL_FIELDS = ['customers', 'orders', 'value']
+    
+    class Meta:
+        ordering = ['cohort', 'month']
+        constraints = [models.UniqueConstraint(fields=['cohort', 'month'], name='unique_cohort_month')]
+    
+    def __str__(self):
+        return f"Cohort {self.cohort:%b %Y} in {self.month:%b %Y}"
+    
+    @staticmethod
+    def month_of(value):
+        return timezone.localtime(value).date().replace(day=1)
+    
+    @classmethod
+    def compute(cls, cohorts):
+        """Build (unsaved) rows for the given cohort months with a single grouped query."""
+        cohorts = sorted(set(cohorts))
+        if not cohorts:
+            return []
+        tz = timezone.get_current_timezone()
+        in_cohorts = Q()
+        for cohort in cohorts:
+            start = timezone.make_aware(datetime.combine(cohort, time.min))
+            end = timezone.make_aware(datetime.combine((cohort + timedelta(days=32)).replace(day=1), time.min))
+            in_cohorts |= Q(customer__stats__first_order_at__gte=start, customer__stats__first_order_at__lt=end)
+        rows = (
+            Order.objects.filter(in_cohorts)
+            .annotate(
+                cohort=TruncMonth('customer__stats__first_order_at', tzinfo=tz),
+                month=TruncMonth('created_at', tzinfo=tz),
+            )
+            .values('cohort', 'month')
+            .annotate(
+                customers=Count('customer', distinct=True),
+                orders=Count('id'),
+                value=Sum(F('total_amount') + F('customer_delivery_amount')),
+            )
+            .order_by()
+        )
+        return [
+            cls(cohort=timezone.localtime(row.pop('cohort')).date(), month=timezone.localtime(row.pop('month')).date(), **row)
+            for row in rows
+        ]
+    
+    @classmethod
+    def refresh(cls, cohorts):
+        """Recompute the rows of the given cohorts, dropping months that no longer have orders."""
+        rows = cls.compute(cohorts)
+        if rows:
+            cls.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['cohort', 'month'],
+                update_fields=cls.TOTAL_FIELDS + ['updated_at'],
+            )
+        kept = Q()
+        for row in rows:
+            kept |= Q(cohort=row.cohort, month=row.month)
+        cls.objects.filter(cohort__in=set(cohorts)).exclude(kept).delete()
+        return rows
@@ -0,0 +1,107 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are addressed by the sort key of the row at their edge rather than by
+an OFFSET, so every page costs the same indexed range scan as the first one
+and no COUNT(*) is needed to render next/previous links.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+def encode_cursor(values):
+    payload = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else value for value in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+class KeysetPage:
+    def __init__(self, paginator, object_list, has_next, has_previous):
+        self.paginator = paginator
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_cursor(self):
+        return self.paginator.cursor_for(self.object_list[-1]) if self.has_next else None
+
+    @property
+    def previous_cursor(self):
+        return self.paginator.cursor_for(self.object_list[0]) if self.has_previous else None
+
+
+class KeysetPaginator:
+    """
+    Paginate ``queryset`` newest first on ``key_fields`` (e.g. ``('created_at', 'id')``),
+    whose last field must be unique. Use ``get_page(after=...)`` for the page after a
+    cursor and ``get_page(before=...)`` for the page before it.
+    """
+
+    def __init__(self, queryset, key_fields, per_page=20):
+        self.queryset = queryset
+        self.key_fields = tuple(key_fields)
+        self.per_page = per_page
+
+    def cursor_for(self, obj):
+        # Rows of a values() queryset are dicts
+        if isinstance(obj, dict):
+            return encode_cursor([obj[field] for field in self.key_fields])
+        return encode_cursor([getattr(obj, field) for field in self.key_fields])
+
+    def decode_cursor(self, cursor):
+        """Return the key values of ``cursor``, or None when it is missing or malformed."""
+        if not cursor:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            if not isinstance(values, list) or len(values) != len(self.key_fields):
+                return None
+            model = self.queryset.model
+            return [model._meta.get_field(field).to_python(value) for field, value in zip(self.key_fields, values)]
+        except (ValueError, TypeError, ValidationError):
+            return None
+
+    def _beyond(self, values, lookup):
+        # (a, b) < (x, y)  <=>  a < x OR (a = x AND b < y), expanded for any number of fields
+        condition = Q()
+        for index, field in enumerate(self.key_fields):
+            equal = {key: value for key, value in zip(self.key_fields[:index], values[:index])}
+            condition |= Q(**equal, **{f'{field}__{lookup}': values[index]})
+        return condition
+
+    def count(self):
+        return self.queryset.count()
+
+    def get_page(self, after=None, before=None):
+        descending = [f'-{field}' for field in self.key_fields]
+        before_values = self.decode_cursor(before)
+        if before_values is not None:
+            rows = list(
+                self.queryset.filter(self._beyond(before_values, 'gt'))
+                .order_by(*self.key_fields)[:self.per_page + 1]
+            )
+            if len(rows) < self.per_page:
+                # Walked back past the newest rows; show a full first page instead
+                return self.get_page()
+            has_previous = len(rows) > self.per_page
+            return KeysetPage(self, list(reversed(rows[:self.per_page])), has_next=True, has_previous=has_previous)
+
+        after_values = self.decode_cursor(after)
+        queryset = self.queryset.order_by(*descending)
+        if after_values is not None:
+            queryset = queryset.filter(self._beyond(after_values, 'lt'))
+        rows = list(queryset[:self.per_page + 1])
+        return KeysetPage(self, rows[:self.per_page], has_next=len(rows) > self.per_page,
+                          has_previous=after_values is not None)
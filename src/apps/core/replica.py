@@ -0,0 +1,182 @@
+"""
+Read replica routing for the heavy read-only pages.
+
+Views decorated with ``@reads_from_replica`` send their reads of the core
+tables to the ``replica`` database alias. Everything else stays on
+``default``: writes, reads inside a transaction, non-GET requests, and auth
+and session tables. Each request falls back to ``default`` when:
+
+* the replica is missing or older than REPLICA_MAX_STALENESS seconds, or
+* the user has written something since the replica was last refreshed.
+  ``LastWriteMiddleware`` stamps a signed cookie on every non-GET request,
+  which gives the user read-your-writes.
+
+On SQLite the replica is a snapshot of the main database, opened read-only.
+``refresh_snapshot()`` (run by the ``refresh_replica`` command) copies it with
+the online backup API and swaps it in atomically. Other engines are treated as
+continuously replicated, with up to REPLICA_MAX_STALENESS seconds of lag.
+"""
+import functools
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_ALIAS = 'replica'
+LAST_WRITE_COOKIE = 'last_write'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_state = threading.local()
+
+
+def max_staleness():
+    return getattr(settings, 'REPLICA_MAX_STALENESS', 300)
+
+
+def _is_sqlite(alias):
+    return settings.DATABASES[alias]['ENGINE'] == 'django.db.backends.sqlite3'
+
+
+def snapshot_path():
+    """Path of the SQLite replica file (its NAME may be a ``file:...?mode=ro`` URI)."""
+    name = str(settings.DATABASES[REPLICA_ALIAS]['NAME'])
+    return Path(name.removeprefix('file:').split('?', 1)[0])
+
+
+def refreshed_at():
+    """When the replica's data was last current, or None if there is no usable replica."""
+    if REPLICA_ALIAS not in settings.DATABASES:
+        return None
+    if not _is_sqlite(REPLICA_ALIAS):
+        return time.time() - max_staleness()
+    try:
+        return os.path.getmtime(snapshot_path())
+    except OSError:
+        return None
+
+
+def replica_for(request):
+    """The alias a read-only request may read from, or None for ``default``."""
+    if request.method not in SAFE_METHODS:
+        return None
+    snapshot_time = refreshed_at()
+    if snapshot_time is None or time.time() - snapshot_time > max_staleness():
+        return None
+    last_write = request.get_signed_cookie(LAST_WRITE_COOKIE, default=None)
+    try:
+        if last_write and float(last_write) >= snapshot_time:
+            return None
+    except ValueError:
+        return None
+    return REPLICA_ALIAS
+
+
+@contextmanager
+def reading_from(alias):
+    previous = getattr(_state, 'alias', None)
+    _state.alias = alias
+    try:
+        yield
+    finally:
+        _state.alias = previous
+
+
+def _streamed_from(alias, content):
+    # Streaming responses run their queries after the view has returned
+    with reading_from(alias):
+        yield from content
+
+
+def reads_from_replica(view):
+    """Route the view's reads to the replica when it is fresh enough for this user."""
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        alias = replica_for(request)
+        with reading_from(alias):
+            response = view(request, *args, **kwargs)
+        if alias and getattr(response, 'streaming', False) and hasattr(response, 'streaming_content'):
+            response.streaming_content = _streamed_from(alias, response.streaming_content)
+        return response
+
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = getattr(_state, 'alias', None)
+        if not alias or model._meta.app_label != 'core':
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Reads inside a transaction must see its own writes
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_ALIAS
+
+
+class LastWriteMiddleware:
+    """Remember when the user last wrote, so their next reads skip an older replica."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self._acall(request)
+        return self._stamp(request, self.get_response(request))
+
+    async def _acall(self, request):
+        return self._stamp(request, await self.get_response(request))
+
+    def _stamp(self, request, response):
+        if request.method not in SAFE_METHODS:
+            response.set_signed_cookie(
+                LAST_WRITE_COOKIE, str(time.time()), max_age=max_staleness(),
+                secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite='Lax',
+            )
+        return response
+
+
+def refresh_snapshot(pages=-1):
+    """
+    Copy the default SQLite database into the replica file with the online
+    backup API and swap it in atomically. Returns the snapshot's size in bytes.
+    """
+    if not (_is_sqlite(DEFAULT_DB_ALIAS) and _is_sqlite(REPLICA_ALIAS)):
+        raise ValueError('Snapshots are only needed when both databases are SQLite')
+    target_path = snapshot_path()
+    temporary_path = target_path.with_name(target_path.name + '.tmp')
+    started = time.time()
+    source = sqlite3.connect(settings.DATABASES[DEFAULT_DB_ALIAS]['NAME'])
+    target = sqlite3.connect(temporary_path)
+    try:
+        source.backup(target, pages=pages)
+    finally:
+        target.close()
+        source.close()
+    # The file's mtime is the refresh time; use the start of the copy so
+    # anything written while it ran counts as newer than the snapshot
+    os.utime(temporary_path, (started, started))
+    # Connections that are already open keep reading the previous file
+    os.replace(temporary_path, target_path)
+    return target_path.stat().st_size
@@ -0,0 +1,145 @@
+"""
+Financial report figures, computed with one conditional aggregation query per table,
+and the customer cohort matrix, read from its precomputed table.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import CustomerCohortMonth, Expense, Order
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y')
+
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD or DD/MM/YYYY string, returning None when empty or invalid."""
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value or '', date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def date_range_bounds(start=None, end=None):
+    """Aware [start, end) datetimes covering the given days; either bound may be None."""
+    lower = timezone.make_aware(datetime.combine(start, time.min)) if start else None
+    upper = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)) if end else None
+    return lower, upper
+
+
+def _in_range(queryset, field, lower, upper):
+    if lower:
+        queryset = queryset.filter(**{f'{field}__gte': lower})
+    if upper:
+        queryset = queryset.filter(**{f'{field}__lt': upper})
+    return queryset
+
+
+def filtered_expenses(start=None, end=None, expense_type=None):
+    lower, upper = date_range_bounds(start, end)
+    expenses = _in_range(Expense.objects.all(), 'date', lower, upper)
+    if expense_type:
+        expenses = expenses.filter(expense_type=expense_type)
+    return expenses
+
+
+def filtered_orders(start=None, end=None, status=None, delivery_type=None):
+    lower, upper = date_range_bounds(start, end)
+    orders = _in_range(Order.objects.all(), 'created_at', lower, upper)
+    if status:
+        orders = orders.filter(status=status)
+    if delivery_type:
+        orders = orders.filter(delivery_payment_type=delivery_type)
+    return orders
+
+
+def financial_summary(start=None, end=None, expense_type=None):
+    """
+    Revenue, expense breakdown and net profit for orders/expenses dated between
+    ``start`` and ``end`` (inclusive days, either may be None for open ended).
+    ``expense_type`` narrows the expense side only; revenue and the business
+    share of delivery always cover every order in the range.
+    """
+    money = DecimalField(max_digits=14, decimal_places=2)
+    zero = Value(Decimal('0'), output_field=money)
+    lower, upper = date_range_bounds(start, end)
+
+    order_totals = _in_range(Order.objects.all(), 'created_at', lower, upper).aggregate(
+        order_count=Count('id'),
+        total_revenue=Coalesce(Sum('total_amount'), zero),
+        business_delivery=Coalesce(Sum('business_delivery_amount'), zero),
+        gross_profit=Coalesce(Sum('gross_profit'), zero),
+        order_profit=Coalesce(Sum('net_profit'), zero),
+    )
+    expense_totals = filtered_expenses(start, end, expense_type).aggregate(
+        general_expenses=Coalesce(Sum('amount', filter=Q(order__isnull=True)), zero),
+        order_expenses=Coalesce(Sum('amount', filter=Q(order__isnull=False)), zero),
+        packaging_expenses=Coalesce(Sum('amount', filter=Q(expense_type='packaging')), zero),
+    )
+
+    total_revenue = order_totals['total_revenue']
+    total_expenses = (
+        expense_totals['general_expenses'] + expense_totals['order_expenses']
+        + order_totals['business_delivery'] + expense_totals['packaging_expenses']
+    )
+    return {
+        'start': start,
+        'end': end,
+        'expense_type': expense_type or '',
+        'order_count': order_totals['order_count'],
+        'total_revenue': total_revenue,
+        'total_expenses': total_expenses,
+        'gross_profit': order_totals['gross_profit'],
+        'order_profit': order_totals['order_profit'],
+        'net_profit': total_revenue - total_expenses,
+        'net_margin': ((total_revenue - total_expenses) / total_revenue * 100) if total_revenue > 0 else 0,
+        'expenses_percentage': (total_expenses / total_revenue * 100) if total_revenue > 0 else 0,
+        'general_expenses': expense_totals['general_expenses'],
+        'order_expenses': expense_totals['order_expenses'],
+        'business_delivery': order_totals['business_delivery'],
+        'packaging_expenses': expense_totals['packaging_expenses'],
+    }
+
+
+def _months_between(first, second):
+    return (second.year - first.year) * 12 + second.month - first.month
+
+
+def cohort_matrix(start=None, end=None, months=12):
+    """
+    Repeat purchases by acquisition month, for the customers whose first order
+    fell between ``start`` and ``end`` (either may be None). Each cohort row has
+    one cell per month since acquisition, up to ``months``, with the share of
+    the cohort that ordered in that month and the cumulative value per customer.
+    """
+    cells = CustomerCohortMonth.objects.all()
+    if start:
+        cells = cells.filter(cohort__gte=start.replace(day=1))
+    if end:
+        cells = cells.filter(cohort__lte=end)
+    cohorts = {}
+    for cell in cells:
+        cohorts.setdefault(cell.cohort, {})[_months_between(cell.cohort, cell.month)] = cell
+
+    current_month = timezone.localdate().replace(day=1)
+    rows = []
+    for cohort, by_offset in cohorts.items():
+        size = by_offset[0].customers if 0 in by_offset else 0
+        value = Decimal('0')
+        row_cells = []
+        for offset in range(min(_months_between(cohort, current_month), months) + 1):
+            cell = by_offset.get(offset)
+            customers = cell.customers if cell else 0
+            value += cell.value if cell else 0
+            row_cells.append({
+                'offset': offset,
+                'customers': customers,
+                'retention': customers / size * 100 if size else 0,
+                'value_per_customer': value / size if size else 0,
+            })
+        rows.append({'cohort': cohort, 'size': size, 'cells': row_cells})
+    return {'rows': rows, 'offsets': list(range(max((len(row['cells']) for row in rows), default=0)))}
@@ -0,0 +1,138 @@
+"""
+Deferred maintenance of the precomputed rollup tables.
+
+Signal handlers don't recompute rollups inline. They queue the affected keys
+(customer ids, dates, ...) with ``schedule()`` and the work runs once per job
+when the surrounding transaction commits, so saving twenty orders for the
+same customer in one transaction refreshes that customer's row once.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+_state = threading.local()
+
+
+def _recalculate_order_totals(order_ids):
+    from .models import Order
+    orders = Order.recalculate_totals(order_ids)
+    # The items also feed each customer's items cost, even when the order totals didn't move
+    schedule('customer_stats', {order.customer_id for order in orders})
+
+
+def _refresh_customer_stats(customer_ids):
+    from .models import CustomerCohortMonth, CustomerStats
+    # A customer's cohort moves when their first order changes, so both the
+    # old and the new cohort are refreshed
+    previous = CustomerStats.objects.filter(customer_id__in=customer_ids, first_order_at__isnull=False)
+    cohorts = {CustomerCohortMonth.month_of(first) for first in previous.values_list('first_order_at', flat=True)}
+    for stats in CustomerStats.refresh(customer_ids):
+        if stats.first_order_at:
+            cohorts.add(CustomerCohortMonth.month_of(stats.first_order_at))
+    schedule('cohorts', cohorts)
+
+
+def _refresh_cohorts(cohorts):
+    from .models import CustomerCohortMonth
+    CustomerCohortMonth.refresh(cohorts)
+
+
+def _refresh_daily_summaries(days):
+    from .models import OrderDailySummary
+    OrderDailySummary.refresh(days)
+    # The same days' cached analytics periods are now out of date
+    schedule('analytics', days)
+
+
+def _invalidate_analytics(days):
+    from . import analytics
+    analytics.invalidate(days)
+
+
+def _reindex_search(keys):
+    from . import search
+    search.reindex(keys)
+
+
+def _invalidate_dashboard(keys):
+    from . import dashboard_metrics
+    dashboard_metrics.invalidate(keys)
+
+
+# Jobs run in this order on every flush, so a job may rely on the ones above it
+# having already run (and may schedule further work for the ones below it).
+JOBS = {
+    'order_totals': _recalculate_order_totals,
+    'customer_stats': _refresh_customer_stats,
+    'cohorts': _refresh_cohorts,
+    'daily_summary': _refresh_daily_summaries,
+    'analytics': _invalidate_analytics,
+    'dashboard': _invalidate_dashboard,
+    'search_index': _reindex_search,
+}
+
+
+def _pending():
+    if not hasattr(_state, 'pending'):
+        _state.pending = {}
+        _state.flushing = False
+    return _state.pending
+
+
+@contextmanager
+def suppressed():
+    """
+    Drop everything scheduled inside the block. Only for bulk loaders that
+    rebuild the rollups with their management commands afterwards.
+    """
+    previous = getattr(_state, 'suppressed', False)
+    _state.suppressed = True
+    try:
+        yield
+    finally:
+        _state.suppressed = previous
+
+
+def schedule(job, keys):
+    """Queue ``keys`` for ``job`` and run it when the current transaction commits."""
+    if job not in JOBS:
+        raise ValueError(f'Unknown rollup job: {job}')
+    if getattr(_state, 'suppressed', False):
+        return
+    keys = {key for key in keys if key is not None}
+    if not keys:
+        return
+    _pending().setdefault(job, set()).update(keys)
+    # Every call registers a hook, but only the first one to run finds work to
+    # do. Keys queued in a transaction that rolled back are picked up by the
+    # next commit, which is harmless because every job recomputes from scratch.
+    transaction.on_commit(flush)
+
+
+def flush():
+    pending = _pending()
+    if _state.flushing:
+        # A job scheduled more work while running; the outer loop picks it up.
+        return
+    _state.flushing = True
+    try:
+        while pending:
+            for job, func in JOBS.items():
+                keys = pending.pop(job, None)
+                if not keys:
+                    continue
+                try:
+                    # Flushing runs after the commit, in autocommit mode; one
+                    # transaction per job keeps multi-statement jobs cheap
+                    with transaction.atomic():
+                        func(sorted(keys))
+                except Exception:
+                    # Rollups can always be rebuilt by their management command,
+                    # so a failure here must not break the write that caused it.
+                    logger.exception('Rollup job %s failed for %d keys', job, len(keys))
+    finally:
+        _state.flushing = False
@@ -0,0 +1,157 @@
+"""
+Global search over customers, orders and expenses.
+
+On SQLite the documents live in an FTS5 virtual table (created by migration
+0011) that the signal handlers keep in sync through the ``search_index``
+rollup job. Other database backends fall back to plain ``icontains`` lookups.
+Order documents include the customer's name, so renaming a customer also
+reindexes their orders.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.urls import reverse
+
+from .models import Customer, Expense, Order
+
+TABLE = 'core_search_index'
+
+CUSTOMER = 'customer'
+ORDER = 'order'
+EXPENSE = 'expense'
+
+
+def fts_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def customer_document(customer):
+    return f'{customer.first_name} {customer.last_name}', f'{customer.phone} {customer.email} {customer.address}'
+
+
+def order_document(order):
+    customer = order.customer
+    return order.order_number, f'{order.get_status_display()} {customer.first_name} {customer.last_name}'
+
+
+def expense_document(expense):
+    return expense.description, expense.expense_type
+
+
+DOCUMENTS = {
+    CUSTOMER: (Customer, customer_document),
+    ORDER: (Order, order_document),
+    EXPENSE: (Expense, expense_document),
+}
+
+
+def _objects(kind, apps=None):
+    model, _ = DOCUMENTS[kind]
+    if apps is not None:
+        model = apps.get_model(model._meta.label)
+    return model.objects.select_related('customer') if kind == ORDER else model.objects.all()
+
+
+def _insert(cursor, rows):
+    cursor.executemany(f'INSERT INTO {TABLE} (kind, object_id, title, body) VALUES (%s, %s, %s, %s)', rows)
+
+
+def reindex(keys):
+    """Refresh the index rows for ``(kind, id)`` pairs, dropping objects that no longer exist."""
+    if not fts_enabled():
+        return
+    ids_by_kind = {}
+    for kind, object_id in keys:
+        ids_by_kind.setdefault(kind, set()).add(object_id)
+    with connection.cursor() as cursor:
+        for kind, ids in ids_by_kind.items():
+            document = DOCUMENTS[kind][1]
+            placeholders = ', '.join(['%s'] * len(ids))
+            cursor.execute(f'DELETE FROM {TABLE} WHERE kind = %s AND object_id IN ({placeholders})', [kind, *ids])
+            _insert(cursor, [(kind, obj.pk, *document(obj)) for obj in _objects(kind).filter(pk__in=ids)])
+
+
+def rebuild(batch_size=1000, apps=None):
+    """
+    Recreate every index row from scratch and return the number of documents
+    indexed. A migration passes its ``apps`` to index its historical models.
+    """
+    indexed = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        for kind, (_, document) in DOCUMENTS.items():
+            batch = []
+            for obj in _objects(kind, apps).order_by('pk').iterator(chunk_size=batch_size):
+                batch.append((kind, obj.pk, *document(obj)))
+                if len(batch) >= batch_size:
+                    _insert(cursor, batch)
+                    indexed += len(batch)
+                    batch = []
+            _insert(cursor, batch)
+            indexed += len(batch)
+    return indexed
+
+
+def match_expression(query):
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    return ' '.join(f'"{token}"*' for token in re.findall(r'\w+', query))
+
+
+def _fts_search(query, kind, limit):
+    expression = match_expression(query)
+    if not expression:
+        return []
+    sql = (
+        f'SELECT kind, object_id, title, body, bm25({TABLE}) AS rank FROM {TABLE} '
+        f'WHERE {TABLE} MATCH %s' + (' AND kind = %s' if kind else '') + ' ORDER BY rank LIMIT %s'
+    )
+    params = [expression, kind, limit] if kind else [expression, limit]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [
+            {'kind': row[0], 'id': int(row[1]), 'title': row[2], 'body': row[3], 'rank': row[4]}
+            for row in cursor.fetchall()
+        ]
+
+
+def _fallback_search(query, kind, limit):
+    lookups = {
+        CUSTOMER: Q(first_name__icontains=query) | Q(last_name__icontains=query) | Q(phone__icontains=query)
+                  | Q(email__icontains=query) | Q(address__icontains=query),
+        ORDER: Q(order_number__icontains=query) | Q(customer__first_name__icontains=query)
+               | Q(customer__last_name__icontains=query),
+        EXPENSE: Q(description__icontains=query) | Q(expense_type__icontains=query),
+    }
+    results = []
+    for doc_kind, (_, document) in DOCUMENTS.items():
+        if kind and doc_kind != kind:
+            continue
+        for obj in _objects(doc_kind).filter(lookups[doc_kind])[:limit - len(results)]:
+            title, body = document(obj)
+            results.append({'kind': doc_kind, 'id': obj.pk, 'title': title, 'body': body, 'rank': None})
+        if len(results) >= limit:
+            break
+    return results
+
+
+def _add_urls(results):
+    order_ids = [result['id'] for result in results if result['kind'] == ORDER]
+    order_customers = dict(Order.objects.filter(pk__in=order_ids).values_list('pk', 'customer_id'))
+    for result in results:
+        if result['kind'] == CUSTOMER:
+            result['url'] = reverse('customer_orders', args=[result['id']])
+        elif result['kind'] == ORDER and result['id'] in order_customers:
+            result['url'] = reverse('customer_orders', args=[order_customers[result['id']]])
+        else:
+            result['url'] = reverse('expense_ledger')
+    return results
+
+
+def search(query, kind=None, limit=20):
+    """Ranked search results (best first) as dicts with kind, id, title, body, rank and url."""
+    query = query.strip()
+    if not query:
+        return []
+    results = _fts_search(query, kind, limit) if fts_enabled() else _fallback_search(query, kind, limit)
+    return _add_urls(results)
@@ -1,10 +1,99 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
-from .models import Order, OrderItem
+from . import dashboard_metrics, images, rollups, search
+from .models import Customer, CustomerCohortMonth, CustomerStats, Expense, ExpenseTerm, Order, OrderDailySummary, OrderItem, Product
 
 @receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
 def update_order_total(sender, instance, **kwargs):
-    # Trigger order save to recalculate total and profit
-    order = instance.order
-    order.calculate_total()
-    order.save()
\ No newline at end of file
+    # Recalculate total and profit once per order when the transaction commits
+    rollups.schedule('order_totals', {instance.order_id, instance.loaded_value('order_id')})
+
+@receiver(post_save, sender=Customer)
+def create_customer_stats(sender, instance, created, **kwargs):
+    if created:
+        rollups.schedule('customer_stats', {instance.pk})
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def refresh_customer_stats(sender, instance, **kwargs):
+    # Refresh both customers when an order is moved from one to another
+    rollups.schedule('customer_stats', {instance.customer_id, instance.loaded_value('customer_id')})
+
+@receiver(pre_delete, sender=Customer)
+def refresh_cohort_of_deleted_customer(sender, instance, **kwargs):
+    # The stats row goes with the customer, so the cohort has to be read now
+    first_order_at = CustomerStats.objects.filter(customer=instance).values_list('first_order_at', flat=True).first()
+    if first_order_at:
+        rollups.schedule('cohorts', {CustomerCohortMonth.month_of(first_order_at)})
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def refresh_daily_summary(sender, instance, **kwargs):
+    # Refresh both days when an order's date is changed
+    days = {OrderDailySummary.day_of(created_at) for created_at in (instance.created_at, instance.loaded_value('created_at')) if created_at}
+    rollups.schedule('daily_summary', days)
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_dashboard_for_order(sender, instance, **kwargs):
+    keys = {dashboard_metrics.COUNTS, dashboard_metrics.RECENT_ORDERS, dashboard_metrics.TOP_CUSTOMERS}
+    for created_at in (instance.created_at, instance.loaded_value('created_at')):
+        if created_at:
+            keys.add(dashboard_metrics.month_revenue_key(created_at))
+    rollups.schedule('dashboard', keys)
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def invalidate_dashboard_for_customer(sender, instance, **kwargs):
+    # Customer names appear in the recent orders and top customers widgets
+    rollups.schedule('dashboard', {dashboard_metrics.COUNTS, dashboard_metrics.RECENT_ORDERS, dashboard_metrics.TOP_CUSTOMERS})
+
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+def invalidate_analytics_for_expense(sender, instance, **kwargs):
+    # Both periods change when an expense is moved to another date
+    days = {OrderDailySummary.day_of(date) for date in (instance.date, instance.loaded_value('date')) if date}
+    rollups.schedule('analytics', days)
+
+@receiver(post_save, sender=Expense)
+def count_expense_terms(sender, instance, created, **kwargs):
+    fields = ('expense_type', 'description', 'date')
+    current = tuple(getattr(instance, name) for name in fields)
+    if not created:
+        if not instance.has_loaded_values():
+            # Saved without being loaded first, so there is no telling what it replaced
+            return
+        previous = tuple(instance.loaded_value(name) for name in fields)
+        if previous == current:
+            return
+        ExpenseTerm.record([previous], delta=-1)
+    ExpenseTerm.record([current])
+
+@receiver(post_delete, sender=Expense)
+def uncount_expense_terms(sender, instance, **kwargs):
+    ExpenseTerm.record([(instance.expense_type, instance.description, instance.date)], delta=-1)
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+def update_search_index(sender, instance, **kwargs):
+    kind = {Customer: search.CUSTOMER, Order: search.ORDER, Expense: search.EXPENSE}[sender]
+    rollups.schedule('search_index', {(kind, instance.pk)})
+
+@receiver(post_save, sender=Customer)
+def reindex_orders_of_renamed_customer(sender, instance, created, **kwargs):
+    # Order documents include the customer's name
+    name = (instance.first_name, instance.last_name)
+    if created or name == (instance.loaded_value('first_name'), instance.loaded_value('last_name')):
+        return
+    rollups.schedule('search_index', {(search.ORDER, pk) for pk in instance.order_set.values_list('pk', flat=True)})
+
+@receiver(post_save, sender=Product)
+def process_product_image(sender, instance, **kwargs):
+    # Thumbnails are made in the background once the upload is committed
+    if images.needs_processing(instance):
+        images.schedule(instance.pk)
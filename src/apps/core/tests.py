@@ -1 +1,1116 @@
-from django.test import TestCase
+"""
+Tests for the core app: view benchmarks first, then behaviour tests.
+
+The benchmarks seed a synthetic dataset per scale with ``seed_synthetic``,
+anchored to a fixed end date so every run sees the same data. Every view is
+requested with a cold cache a few times, and the test fails if a request runs
+more queries than the view's budget. Query budgets are the same at every
+scale, so an N+1 query shows up as a failure at the larger scale rather than
+as a slow page in production. Median latencies are only reported, since
+wall-clock budgets would fail at random on a busy machine.
+
+The behaviour tests check writes and their side effects (rollups, caches,
+counters, files), plus the commands and endpoints the benchmarks don't cover.
+"""
+import csv
+import hashlib
+import importlib
+import io
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, connection, router
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Count
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from . import analytics, bulk, dashboard_metrics, exports, images, instrumentation, reports, search
+from .models import (
+    Customer, CustomerStats, Expense, ExpenseTerm, Order, OrderDailySummary, OrderItem, Product, Sequence,
+)
+from .pagination import KeysetPaginator
+from .replica import REPLICA_ALIAS, LastWriteMiddleware, reading_from
+
+RUNS = 5
+BENCHMARK_END_DATE = date(2026, 6, 30)
+
+# name -> max queries per request
+BUDGETS = {
+    'dashboard': 7,
+    'customers_by_name': 4,
+    'customers_by_first_order': 4,
+    'customers_by_ties': 4,
+    'orders': 3,
+    'customer_orders': 4,
+    'customer_orders_page': 3,
+    'financial_report': 5,
+    'edit_order': 4,
+    'api_orders': 3,
+    'analytics_daily': 4,
+    'cohorts': 3,
+    'expense_suggestions': 3,
+}
+
+# Every test here: the test client speaks plain HTTP, and the cache lives in
+# the test process instead of BASE_DIR/cache
+TEST_SETTINGS = override_settings(
+    SECURE_SSL_REDIRECT=False,
+    SESSION_COOKIE_SECURE=False,
+    CSRF_COOKIE_SECURE=False,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+
+
+def setUpModule():
+    TEST_SETTINGS.enable()
+
+
+def tearDownModule():
+    TEST_SETTINGS.disable()
+
+
+class ViewBenchmarkMixin:
+    scale = {}
+    results = None
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_synthetic', **cls.scale, end_date=BENCHMARK_END_DATE, stdout=io.StringIO())
+        cls.user = User.objects.create_superuser('benchmark', 'benchmark@example.com', 'benchmark')
+        cls.busiest_customer = Customer.objects.annotate(orders=Count('order')).order_by('-orders').first()
+        cls.latest_order = Order.objects.order_by('-created_at', '-pk').first()
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.results = []
+
+    @classmethod
+    def tearDownClass(cls):
+        sys.stderr.write(f'\n{cls.__name__} ({cls.scale}):\n')
+        for name, queries, median in cls.results:
+            sys.stderr.write(f'  {name:<26} {queries:>3} queries  {median:8.1f} ms\n')
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def benchmark(self, name, url):
+        max_queries = BUDGETS[name]
+        timings = []
+        for _ in range(RUNS):
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = self.client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertLessEqual(
+                len(queries), max_queries,
+                f'{name} ran {len(queries)} queries (budget {max_queries}):\n'
+                + '\n'.join(query['sql'] for query in queries.captured_queries),
+            )
+        self.results.append((name, len(queries), statistics.median(timings)))
+
+    def test_dashboard(self):
+        self.benchmark('dashboard', '/dashboard/')
+
+    def test_customers_by_name(self):
+        self.benchmark('customers_by_name', '/customers/?sort=name')
+
+    def test_customers_by_first_order(self):
+        self.benchmark('customers_by_first_order', '/customers/?sort=first_order')
+
+    def test_customers_by_ties(self):
+        self.benchmark('customers_by_ties', '/customers/?sort=ties')
+
+    def test_orders(self):
+        self.benchmark('orders', '/orders/')
+
+    def test_customer_orders(self):
+        self.benchmark('customer_orders', f'/customers/{self.busiest_customer.pk}/orders/')
+
+    def test_customer_orders_page(self):
+        self.benchmark('customer_orders_page', f'/customers/{self.busiest_customer.pk}/orders/page/')
+
+    def test_financial_report(self):
+        self.benchmark('financial_report', '/financial-report/')
+
+    def test_edit_order(self):
+        self.benchmark('edit_order', f'/orders/edit/{self.latest_order.pk}/')
+
+    def test_api_orders(self):
+        self.benchmark('api_orders', '/api/orders/?limit=500')
+
+    def test_analytics_daily(self):
+        start = BENCHMARK_END_DATE - timedelta(days=365)
+        self.benchmark('analytics_daily', f'/analytics/?granularity=day&start={start}')
+
+    def test_cohorts(self):
+        self.benchmark('cohorts', '/analytics/cohorts/?start=2000-01-01')
+
+    def test_expense_suggestions(self):
+        self.benchmark('expense_suggestions', '/expenses/suggest/?kind=description&q=a')
+
+
+class SmallScaleBenchmarkTests(ViewBenchmarkMixin, TestCase):
+    scale = {'customers': 30, 'orders': 300, 'expenses': 100, 'products': 10}
+
+
+class MediumScaleBenchmarkTests(ViewBenchmarkMixin, TestCase):
+    scale = {'customers': 300, 'orders': 3000, 'expenses': 1000, 'products': 30}
+
+
+def make_customer(**fields):
+    return Customer.objects.create(**{
+        'first_name': 'Ada', 'last_name': 'Obi', 'email': '', 'phone': '08030000000', 'address': 'Lagos', **fields,
+    })
+
+
+def make_order(customer, **fields):
+    return Order.objects.create(customer=customer, **{'created_at': timezone.now(), **fields})
+
+
+class ExpenseFormTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('owner', 'owner@example.com', 'owner')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def expenses_on(self, day):
+        return analytics.series('day', day, day)[0]['expenses']
+
+    def test_posted_expenses_update_cached_closed_periods(self):
+        day = timezone.localdate() - timedelta(days=40)
+        moved_to = day - timedelta(days=1)
+        # Both days are over, so these cache their periods without a timeout
+        self.assertEqual(self.expenses_on(day), 0)
+        self.assertEqual(self.expenses_on(moved_to), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/financial-report/', {
+                'amount': '50', 'expense_type': 'Ads', 'description': 'Instagram boost',
+                'date': day.strftime('%d/%m/%Y'),
+            })
+        self.assertEqual(response.status_code, 302)
+        expense = Expense.objects.get()
+        self.assertTrue(timezone.is_aware(expense.date))
+        self.assertEqual(timezone.localtime(expense.date).date(), day)
+        self.assertEqual(self.expenses_on(day), 50)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/expenses/update/', {
+                'expense_id': expense.pk, 'amount': '60', 'expense_type': 'Ads',
+                'description': 'Instagram boost', 'date': moved_to.isoformat(),
+            })
+        self.assertEqual(response.status_code, 302)
+        expense.refresh_from_db()
+        self.assertEqual(expense.amount, 60)
+        self.assertEqual(timezone.localtime(expense.date).date(), moved_to)
+        self.assertEqual(self.expenses_on(day), 0)
+        self.assertEqual(self.expenses_on(moved_to), 60)
+
+
+class ExpenseTermTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('owner', 'owner@example.com', 'owner')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_pages_include_the_suggestion_lists_once(self):
+        for url in ('/expenses/', '/financial-report/'):
+            content = self.client.get(url).content.decode()
+            self.assertEqual(content.count('id="expenseTypeOptions"'), 1, url)
+            title = content[content.index('<title>'):content.index('</title>')]
+            self.assertNotIn('<', title[len('<title>'):], url)
+
+    def terms(self, kind):
+        return dict(ExpenseTerm.objects.filter(kind=kind).values_list('normalized', 'usage_count'))
+
+    def test_writes_count_normalized_terms(self):
+        now = timezone.now()
+        expense = Expense.objects.create(expense_type='Delivery', description='Courier  to Lekki', amount=10, date=now)
+        Expense.objects.create(expense_type=' delivery', description='courier to lekki', amount=10, date=now)
+        self.assertEqual(self.terms(ExpenseTerm.TYPE), {'delivery': 2})
+        self.assertEqual(self.terms(ExpenseTerm.DESCRIPTION), {'courier to lekki': 2})
+
+        expense.expense_type = 'Packaging'
+        expense.save()
+        # Saving the same instance again must not count the edit twice
+        expense.amount = 20
+        expense.save()
+        self.assertEqual(self.terms(ExpenseTerm.TYPE), {'delivery': 1, 'packaging': 1})
+
+        Expense.objects.get(pk=expense.pk).delete()
+        self.assertEqual(self.terms(ExpenseTerm.TYPE), {'delivery': 1})
+        self.assertEqual(self.terms(ExpenseTerm.DESCRIPTION), {'courier to lekki': 1})
+
+    def test_bulk_deleted_orders_uncount_their_expenses(self):
+        order = make_order(make_customer())
+        Expense.objects.create(expense_type='Packaging', description='Gift box', amount=5, date=timezone.now(), order=order)
+        Expense.objects.create(expense_type='packaging', description='Ribbon', amount=5, date=timezone.now())
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk.delete(Order.objects.filter(pk=order.pk))
+        self.assertEqual(self.terms(ExpenseTerm.TYPE), {'packaging': 1})
+        self.assertEqual(self.terms(ExpenseTerm.DESCRIPTION), {'ribbon': 1})
+        call_command('rebuild_expense_terms', check=True, stdout=io.StringIO())
+
+    def test_suggestions_rank_prefix_matches_by_use(self):
+        for expense_type in ('Packaging', 'packaging', 'Paint', 'Transport'):
+            Expense.objects.create(expense_type=expense_type, description='Box', amount=1, date=timezone.now())
+        response = self.client.get('/expenses/suggest/?kind=type&q=PA')
+        self.assertEqual(
+            [(term['value'], term['usage_count']) for term in response.json()['results']],
+            [('packaging', 2), ('Paint', 1)],
+        )
+        self.assertEqual(self.client.get('/expenses/suggest/?kind=amount').status_code, 400)
+        self.assertEqual(self.client.get('/expenses/suggest/?limit=ten').status_code, 400)
+
+
+class AnalyticsCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_write_during_compute_does_not_stay_cached(self):
+        day = timezone.localdate() - timedelta(days=40)
+        compute = analytics.compute
+
+        def compute_then_write(*args):
+            periods = compute(*args)
+            # Another request records an expense on that day before this one caches its result
+            with self.captureOnCommitCallbacks(execute=True):
+                Expense.objects.create(
+                    expense_type='Ads', description='Boost', amount=30,
+                    date=timezone.make_aware(datetime(day.year, day.month, day.day, 12)),
+                )
+            return periods
+
+        with mock.patch.object(analytics, 'compute', compute_then_write):
+            self.assertEqual(analytics.series('day', day, day)[0]['expenses'], 0)
+        self.assertEqual(analytics.series('day', day, day)[0]['expenses'], 30)
+
+
+class SeedSyntheticTests(TestCase):
+    def test_orders_only_use_real_statuses(self):
+        call_command('seed_synthetic', customers=5, orders=200, expenses=0, products=2, stdout=io.StringIO())
+        statuses = set(Order.objects.values_list('status', flat=True))
+        self.assertLessEqual(statuses, {status for status, _ in Order.STATUS_CHOICES})
+        self.assertIn('delivered', statuses)
+
+    def test_data_is_anchored_to_the_end_date(self):
+        call_command('seed_synthetic', customers=5, orders=50, expenses=20, products=2, days=30,
+                     end_date=date(2025, 1, 31), stdout=io.StringIO())
+        days = {OrderDailySummary.day_of(created_at) for created_at in Order.objects.values_list('created_at', flat=True)}
+        days |= {OrderDailySummary.day_of(spent_at) for spent_at in Expense.objects.values_list('date', flat=True)}
+        self.assertGreaterEqual(min(days), date(2025, 1, 2))
+        self.assertLessEqual(max(days), date(2025, 1, 31))
+
+
+class CustomerStatsTests(TestCase):
+    def assert_stats_current(self):
+        call_command('rebuild_customer_stats', check=True, stdout=io.StringIO())
+
+    def test_order_writes_keep_stats_current(self):
+        ada, bola = make_customer(), make_customer(first_name='Bola')
+        product = Product.objects.create(sku='TIE-1', unit_price=10000, cost_price=4000)
+        with self.captureOnCommitCallbacks(execute=True):
+            order = make_order(ada, number_of_ties=2, customer_delivery_amount=1500)
+            OrderItem.objects.create(order=order, product=product, quantity=2)
+        stats = CustomerStats.objects.get(customer=ada)
+        self.assertEqual(
+            (stats.order_count, stats.ties_bought, stats.total_amount, stats.items_cost_total, stats.lifetime_value),
+            (1, 2, 20000, 8000, 21500),
+        )
+        self.assertEqual(stats.latest_order_number, order.order_number)
+        self.assert_stats_current()
+
+        # Moving the order refreshes both customers, and the same instance can be moved on again
+        order = Order.objects.get(pk=order.pk)
+        cleo = make_customer(first_name='Cleo')
+        for previous, customer in ((ada, bola), (bola, cleo)):
+            with self.captureOnCommitCallbacks(execute=True):
+                order.customer = customer
+                order.save()
+            self.assertEqual(CustomerStats.objects.get(customer=previous).order_count, 0)
+            self.assertEqual(CustomerStats.objects.get(customer=customer).lifetime_value, 21500)
+            self.assert_stats_current()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.delete()
+        stats = CustomerStats.objects.get(customer=cleo)
+        self.assertEqual((stats.order_count, stats.lifetime_value, stats.first_order_at), (0, 0, None))
+        self.assert_stats_current()
+
+    def test_check_reports_drift_and_rebuild_repairs_it(self):
+        ada = make_customer()
+        with self.captureOnCommitCallbacks(execute=True):
+            make_order(ada, number_of_ties=3, total_amount=30000)
+        CustomerStats.objects.filter(customer=ada).update(ties_bought=7)
+        out = io.StringIO()
+        with self.assertRaises(CommandError):
+            call_command('rebuild_customer_stats', check=True, stdout=out)
+        self.assertIn('stale ties_bought', out.getvalue())
+
+        call_command('rebuild_customer_stats', stdout=io.StringIO())
+        self.assertEqual(CustomerStats.objects.get(customer=ada).ties_bought, 3)
+        self.assert_stats_current()
+
+
+class SequenceTests(TestCase):
+    def test_reserved_ranges_follow_on_from_existing_order_numbers(self):
+        customer = make_customer()
+        Order.objects.create(customer=customer, order_number='00041', created_at=timezone.now())
+        Order.objects.create(customer=customer, order_number='WEB-9000', created_at=timezone.now())
+        Sequence.objects.filter(name=Sequence.ORDER_NUMBER).delete()
+        self.assertEqual(list(Sequence.reserve(Sequence.ORDER_NUMBER, 3)), [42, 43, 44])
+        self.assertEqual(list(Sequence.reserve(Sequence.ORDER_NUMBER)), [45])
+        self.assertEqual(make_order(customer).order_number, '00046')
+        with self.assertRaises(ValueError):
+            Sequence.reserve(Sequence.ORDER_NUMBER, 0)
+
+
+class ConcurrentSequenceTests(TransactionTestCase):
+    def test_concurrent_reservations_never_overlap(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            # Threads sharing an in-memory database fail on its table locks instead of waiting
+            self.skipTest("needs an on-disk test database (DATABASES['default']['TEST']['NAME'])")
+        values, errors = [], []
+
+        def reserve():
+            try:
+                for count in (1, 2, 3) * 5:
+                    values.extend(Sequence.reserve('test', count))
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=reserve) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(values), list(range(1, len(values) + 1)))
+
+
+class OrderTotalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_customer()
+        cls.tie = Product.objects.create(sku='TIE-1', unit_price=10000, cost_price=4000)
+        cls.box = Product.objects.create(sku='BOX-1', unit_price=1500, cost_price=500)
+
+    def test_item_writes_recalculate_each_order_once_on_commit(self):
+        order = make_order(self.customer, delivery_payment_type='business', delivery_fee=2000)
+        with mock.patch.object(Order, 'recalculate_totals', wraps=Order.recalculate_totals) as recalculate:
+            with self.captureOnCommitCallbacks(execute=True):
+                OrderItem.objects.create(order=order, product=self.tie, quantity=2)
+                OrderItem.objects.create(order=order, product=self.box, quantity=1)
+                OrderItem.objects.bulk_create([OrderItem(order=order, product=self.box, quantity=1)])
+                # Nothing is recalculated until the transaction commits
+                recalculate.assert_not_called()
+        recalculate.assert_called_once_with([order.pk])
+        order.refresh_from_db()
+        self.assertEqual(
+            (order.total_amount, order.total_cost, order.gross_profit, order.net_profit),
+            (23000, 9000, 14000, 12000),
+        )
+
+    def test_moving_and_deleting_items_recalculate_every_order_involved(self):
+        first, second = make_order(self.customer), make_order(self.customer)
+        with self.captureOnCommitCallbacks(execute=True):
+            item = OrderItem.objects.create(order=first, product=self.tie, quantity=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            item.order = second
+            item.save()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.total_amount, second.total_amount), (0, 10000))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item.delete()
+        second.refresh_from_db()
+        self.assertEqual((second.total_amount, second.total_cost), (0, 0))
+
+
+class OrderProfitTests(TestCase):
+    def stored_profit(self, order):
+        return tuple(Order.objects.filter(pk=order.pk).values_list('gross_profit', 'net_profit').get())
+
+    def test_profit_columns_follow_delivery_and_item_edits(self):
+        order = make_order(make_customer(), total_amount=20000, total_cost=8000, delivery_fee=3000)
+        self.assertEqual(self.stored_profit(order), (12000, 12000))
+
+        order.delivery_payment_type = 'business'
+        order.save(update_fields=['delivery_payment_type'])
+        self.assertEqual(self.stored_profit(order), (12000, 9000))
+
+        order.delivery_payment_type, order.business_delivery_amount = 'shared', 1000
+        order.save()
+        self.assertEqual(self.stored_profit(order), (12000, 11000))
+
+        tie = Product.objects.create(sku='TIE-1', unit_price=10000, cost_price=4000)
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderItem.objects.create(order=order, product=tie, quantity=3)
+        self.assertEqual(self.stored_profit(order), (18000, 17000))
+
+    def test_check_reports_drift_and_a_recompute_repairs_it(self):
+        customer = make_customer()
+        order = make_order(customer, total_amount=20000, total_cost=8000, delivery_payment_type='business',
+                           delivery_fee=3000)
+        make_order(customer, total_amount=5000, total_cost=2000)
+        call_command('recompute_order_financials', check=True, stdout=io.StringIO())
+
+        Order.objects.filter(pk=order.pk).update(net_profit=12000)
+        out = io.StringIO()
+        with self.assertRaisesMessage(CommandError, '1 of 2 orders have a stale gross or net profit'):
+            call_command('recompute_order_financials', check=True, batch_size=1, stdout=out)
+        self.assertIn(f'Order {order.pk}: stored 12000.00/12000.00, expected 12000.00/9000.00', out.getvalue())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('recompute_order_financials', stdout=io.StringIO())
+        self.assertEqual(self.stored_profit(order), (12000, 9000))
+        call_command('recompute_order_financials', check=True, stdout=io.StringIO())
+
+
+class FinancialSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        def at(*args):
+            return timezone.make_aware(datetime(*args))
+
+        customer = make_customer()
+        make_order(customer, total_amount=99999, created_at=at(2026, 2, 28, 23, 59))
+        first = make_order(customer, total_amount=10000, total_cost=4000, delivery_fee=2000,
+                           delivery_payment_type='business', business_delivery_amount=2000,
+                           created_at=at(2026, 3, 1))
+        make_order(customer, total_amount=6000, total_cost=2000, delivery_fee=1000, delivery_payment_type='shared',
+                   customer_delivery_amount=500, business_delivery_amount=500, created_at=at(2026, 3, 31, 23, 59))
+        make_order(customer, total_amount=99999, created_at=at(2026, 4, 1))
+        for description, expense_type, amount, order, spent_at in [
+            ('Shop rent', 'rent', 3000, None, at(2026, 3, 1)),
+            ('Courier', 'transport', 700, first, at(2026, 3, 31, 23)),
+            ('Boxes', 'packaging', 400, None, at(2026, 3, 15)),
+            ('Shop rent', 'rent', 9999, None, at(2026, 4, 1)),
+            ('Shop rent', 'rent', 9999, None, at(2026, 2, 28, 23, 59)),
+        ]:
+            Expense.objects.create(description=description, expense_type=expense_type, amount=amount, order=order,
+                                   date=spent_at)
+
+    def test_totals_cover_the_boundary_days_only(self):
+        summary = reports.financial_summary(date(2026, 3, 1), date(2026, 3, 31))
+        self.assertEqual({key: summary[key] for key in (
+            'order_count', 'total_revenue', 'gross_profit', 'order_profit', 'general_expenses', 'order_expenses',
+            'business_delivery', 'packaging_expenses', 'total_expenses', 'net_profit',
+        )}, {
+            'order_count': 2, 'total_revenue': 16000, 'gross_profit': 10000, 'order_profit': 7500,
+            'general_expenses': 3400, 'order_expenses': 700, 'business_delivery': 2500, 'packaging_expenses': 400,
+            'total_expenses': 7000, 'net_profit': 9000,
+        })
+
+        # The expense type narrows the expenses, never the orders
+        rent = reports.financial_summary(date(2026, 3, 1), date(2026, 3, 31), expense_type='rent')
+        self.assertEqual(
+            (rent['total_revenue'], rent['general_expenses'], rent['order_expenses'], rent['total_expenses']),
+            (16000, 3000, 0, 5500),
+        )
+
+    def test_dates_are_parsed_leniently(self):
+        self.assertEqual(reports.parse_date('2026-03-01'), date(2026, 3, 1))
+        self.assertEqual(reports.parse_date('01/03/2026'), date(2026, 3, 1))
+        for invalid in ('2026-02-30', '03/31/2026', 'soon', '', None):
+            self.assertIsNone(reports.parse_date(invalid), invalid)
+
+        # An invalid bound leaves that side of the range open
+        self.client.force_login(User.objects.create_user('owner', password='owner'))
+        data = self.client.get('/financial-report/data/', {'start': '2026-02-30', 'end': '2026-03-31'}).json()
+        self.assertEqual((data['start'], data['order_count'], Decimal(data['total_revenue'])), (None, 3, 115999))
+
+
+
+class CohortTests(TestCase):
+    def month(self, offset):
+        """Noon on the 10th, ``offset`` months after the month three months ago."""
+        first = timezone.localdate().replace(day=1)
+        index = first.year * 12 + first.month - 1 - 3 + offset
+        return timezone.make_aware(datetime(index // 12, index % 12 + 1, 10, 12))
+
+    def rows(self):
+        return {
+            row['cohort']: (row['size'], [
+                (cell['customers'], cell['retention'], cell['value_per_customer']) for cell in row['cells']
+            ])
+            for row in reports.cohort_matrix()['rows']
+        }
+
+    def test_matrix_follows_order_moves_and_customer_deletes(self):
+        first, second = self.month(0).date().replace(day=1), self.month(1).date().replace(day=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            ada, bola, cleo = (make_customer(first_name=name) for name in ('Ada', 'Bola', 'Cleo'))
+            make_order(ada, total_amount=10000, created_at=self.month(0))
+            moved = make_order(ada, total_amount=5000, created_at=self.month(1))
+            make_order(bola, total_amount=20000, created_at=self.month(0))
+            make_order(bola, total_amount=3000, customer_delivery_amount=1000, created_at=self.month(2))
+            make_order(cleo, total_amount=8000, created_at=self.month(1))
+        self.assertEqual(self.rows(), {
+            first: (2, [(2, 100, 15000), (1, 50, 17500), (1, 50, 19500), (0, 0, 19500)]),
+            second: (1, [(1, 100, 8000), (0, 0, 8000), (0, 0, 8000)]),
+        })
+
+        with self.captureOnCommitCallbacks(execute=True):
+            moved.created_at = self.month(2)
+            moved.save()
+        self.assertEqual(self.rows()[first][1][1:3], [(0, 0, 15000), (2, 100, 19500)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bola.delete()
+        self.assertEqual(self.rows()[first], (1, [(1, 100, 10000), (0, 0, 10000), (1, 100, 15000), (0, 0, 15000)]))
+        call_command('rebuild_cohorts', check=True, stdout=io.StringIO())
+
+
+
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        customer = make_customer()
+        now = timezone.now()
+        # Three orders share a timestamp, so pages must break the tie on id
+        for minutes in (0, 1, 1, 1, 2, 3, 4):
+            make_order(customer, created_at=now - timedelta(minutes=minutes))
+        cls.newest_first = list(Order.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+
+    def paginator(self, per_page=3):
+        return KeysetPaginator(Order.objects.all(), ('created_at', 'id'), per_page=per_page)
+
+    def ids(self, page):
+        return [order.pk for order in page]
+
+    def test_walking_forward_and_back_visits_every_row_once(self):
+        paginator = self.paginator()
+        pages = [paginator.get_page()]
+        while pages[-1].has_next:
+            pages.append(paginator.get_page(after=pages[-1].next_cursor))
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum((self.ids(page) for page in pages), []), self.newest_first)
+        self.assertEqual([page.has_previous for page in pages], [False, True, True])
+
+        back = paginator.get_page(before=pages[-1].previous_cursor)
+        self.assertEqual(self.ids(back), self.ids(pages[1]))
+        self.assertTrue(back.has_previous and back.has_next)
+
+    def test_edges(self):
+        paginator = self.paginator(per_page=7)
+        page = paginator.get_page()
+        # Exactly one full page: there is no empty page after it
+        self.assertEqual((len(page), page.has_next, page.next_cursor), (7, False, None))
+
+        # A page starting one row below the newest: going back from it would give
+        # a one-row page, so a full first page is shown instead
+        paginator = self.paginator()
+        shifted = paginator.get_page(after=paginator.cursor_for(Order.objects.get(pk=self.newest_first[0])))
+        self.assertEqual(self.ids(shifted), self.newest_first[1:4])
+        first = paginator.get_page(before=shifted.previous_cursor)
+        self.assertEqual(self.ids(first), self.newest_first[:3])
+        self.assertFalse(first.has_previous)
+
+        for cursor in ('not-a-cursor', 'WzFd', ''):
+            self.assertEqual(self.ids(paginator.get_page(after=cursor)), self.newest_first[:3], cursor)
+
+
+class ImportOrdersTests(TestCase):
+    CSV = (
+        'name,phone,address,order_date,number_of_ties,total_amount,status,order_number\n'
+        'Ada Obi,0801,Lekki,2026-01-05,2,20000,delivered,\n'
+        'Ada Obi,0801,Lekki,06/01/2026,1,9000,,\n'
+        'Bola Eze,0802,Yaba,2026-01-07,1,9000,new,00500\n'
+        'Cleo Ojo,0803,Ikeja,2026-13-01,1,9000,new,\n'
+        'Cleo Ojo,0803,Ikeja,2026-01-08,1,9000,completed,\n'
+        'No Phone,,Ikeja,2026-01-08,1,9000,new,\n'
+        'Dayo Ade,0804,Ikoyi,2026-01-09,two,9000,new,\n'
+        'Bola Eze,0802,Yaba,2026-01-10,1,9000,new,00500\n'
+        'Efe Uzo,0805,Wuse,2026-01-11,1,9000,new,00042\n'
+    )
+
+    def setUp(self):
+        self.existing = make_customer(first_name='Ada', last_name='Existing', phone='0801')
+        make_order(self.existing, order_number='00042')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def run_import(self, name, content, **options):
+        path = self.directory / name
+        path.write_text(content)
+        out, err = io.StringIO(), io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_orders', str(path), batch_size=2, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        out, err = self.run_import('orders.csv', self.CSV)
+        self.assertIn('Imported 3 orders and 1 new customers from 9 rows', out)
+        self.assertIn('skipped 6 invalid rows', out)
+        for message in (
+            'Line 5: order_date must be', "Line 6: unknown status 'completed'", 'Line 7: phone is required',
+            "Line 8: number_of_ties is not a whole number: 'two'", 'Line 9: order number 00500 already exists',
+            'Line 10: order number 00042 already exists',
+        ):
+            self.assertIn(message, err)
+
+    def test_customers_are_matched_by_phone_across_batches(self):
+        self.run_import('orders.csv', self.CSV)
+        # Both 0801 rows go to the existing customer; 0802 is created once
+        self.assertEqual(Customer.objects.filter(phone='0801').count(), 1)
+        self.assertEqual(self.existing.order_set.count(), 3)
+        bola = Customer.objects.get(phone='0802')
+        self.assertEqual((bola.first_name, bola.last_name), ('Bola', 'Eze'))
+        self.assertEqual(list(bola.order_set.values_list('order_number', flat=True)), ['00500'])
+        # Generated numbers stay clear of the imported ones
+        self.assertEqual(Order.allocate_order_numbers(1), ['00501'])
+        call_command('rebuild_customer_stats', check=True, stdout=io.StringIO())
+
+    def test_numbered_and_unnumbered_rows_in_one_batch(self):
+        content = (
+            'name,phone,order_date,total_amount,order_number\n'
+            'Ada Obi,0801,2026-01-05,100,00043\n'
+            'Ada Obi,0801,2026-01-06,100,\n'
+            'Bola Eze,0802,2026-01-07,100,\n'
+        )
+        path = self.directory / 'mixed.csv'
+        path.write_text(content)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_orders', str(path), batch_size=3, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(
+            sorted(Order.objects.values_list('order_number', flat=True)), ['00042', '00043', '00044', '00045'],
+        )
+
+    def test_dry_run_writes_nothing(self):
+        out, _ = self.run_import('orders.csv', self.CSV, dry_run=True)
+        self.assertIn('Would import 3 orders and 1 new customers', out)
+        self.assertEqual((Customer.objects.count(), Order.objects.count()), (1, 1))
+
+    def test_jsonl_rejects_lines_that_are_not_objects(self):
+        content = '{"name": "Ada Obi", "phone": "0801", "order_date": "2026-01-05", "total_amount": 100}\n\n[1]\n{oops\n'
+        out, err = self.run_import('orders.jsonl', content)
+        self.assertIn('Imported 1 orders', out)
+        self.assertIn('Line 3: expected a JSON object', err)
+        self.assertIn('Line 4:', err)
+
+
+class BulkOrderTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.ada, self.bola = make_customer(), make_customer(first_name='Bola', phone='0802')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.orders = [
+                make_order(self.ada, status=status, number_of_ties=2, total_amount=10000)
+                for status in ('new', 'processing', 'delivered')
+            ]
+            self.other = make_order(self.bola, number_of_ties=1, total_amount=5000)
+
+    def test_transition_skips_disallowed_orders_and_refreshes_what_shows_status(self):
+        recent = {order.pk: order.status for order in dashboard_metrics.get_metrics()['recent_orders']}
+        self.assertEqual(recent[self.orders[0].pk], 'new')
+        with self.captureOnCommitCallbacks(execute=True):
+            updated, skipped = bulk.transition(Order.objects.filter(customer=self.ada), 'shipped')
+        self.assertEqual((updated, skipped), (2, 1))
+        self.assertEqual(
+            [order.status for order in Order.objects.filter(pk__in=[o.pk for o in self.orders]).order_by('pk')],
+            ['shipped', 'shipped', 'delivered'],
+        )
+        recent = {order.pk: order.status for order in dashboard_metrics.get_metrics()['recent_orders']}
+        self.assertEqual(recent[self.orders[0].pk], 'shipped')
+        self.assertEqual(
+            {result['id'] for result in search.search('shipped', kind=search.ORDER)},
+            {self.orders[0].pk, self.orders[1].pk},
+        )
+        with self.assertRaises(ValueError):
+            bulk.transition(Order.objects.all(), 'new')
+
+    def test_delete_removes_items_and_expenses_and_refreshes_rollups(self):
+        product = Product.objects.create(sku='TIE-1', unit_price=5000, cost_price=2000)
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderItem.objects.create(order=self.orders[0], product=product, quantity=2)
+            Expense.objects.create(
+                expense_type='packaging', description='Gift box', amount=500, date=timezone.now(), order=self.orders[0],
+            )
+        self.assertEqual(dashboard_metrics.get_metrics()['total_orders'], 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            deleted = bulk.delete(Order.objects.filter(customer=self.ada))
+        self.assertEqual(deleted, 3)
+        self.assertEqual(list(Order.objects.values_list('pk', flat=True)), [self.other.pk])
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertFalse(Expense.objects.exists())
+        self.assertEqual(CustomerStats.objects.get(customer=self.ada).order_count, 0)
+        totals = OrderDailySummary.objects.totals()
+        self.assertEqual((totals['order_count'], totals['revenue']), (1, 5000))
+        self.assertEqual(dashboard_metrics.get_metrics()['total_orders'], 1)
+        self.assertEqual(search.search('gift'), [])
+        call_command('rebuild_customer_stats', check=True, stdout=io.StringIO())
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ada = make_customer(first_name='Ada', phone='0801')
+        now = timezone.now()
+        cls.orders = [
+            make_order(cls.ada, number_of_ties=count, created_at=now - timedelta(hours=count)) for count in range(1, 6)
+        ]
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('clerk', password='clerk'))
+
+    def get(self, resource, **params):
+        return self.client.get(f'/api/{resource}/', params)
+
+    def test_fields_selects_columns_and_rejects_unknown_ones(self):
+        results = self.get('orders', fields='order_number,customer_phone,order_number', limit=1).json()['results']
+        self.assertEqual(results, [{'order_number': self.orders[0].order_number, 'customer_phone': '0801'}])
+
+        response = self.get('orders', fields='order_number,secret')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Unknown field(s): secret', response.json()['error'])
+
+    def test_ids_fetches_rows_in_the_order_asked(self):
+        wanted = [self.orders[3].pk, 999999, self.orders[0].pk, self.orders[3].pk]
+        results = self.get('orders', ids=','.join(map(str, wanted)), fields='id').json()['results']
+        self.assertEqual(results, [{'id': self.orders[3].pk}, {'id': self.orders[0].pk}])
+        self.assertEqual(self.get('orders', ids='1,x').status_code, 400)
+
+    def test_cursor_walks_every_row_once_newest_first(self):
+        seen, after = [], None
+        while True:
+            params = {'fields': 'id', 'limit': 2, **({'after': after} if after else {})}
+            body = self.get('orders', **params).json()
+            seen += [row['id'] for row in body['results']]
+            after = body['next_cursor']
+            if not after:
+                break
+        self.assertEqual(seen, [order.pk for order in self.orders])
+        self.assertEqual(self.get('orders', limit='ten').status_code, 400)
+
+
+class AsyncDashboardTests(TransactionTestCase):
+    # Committed data, since the widgets are read from worker threads with their own connections
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser('owner', 'owner@example.com', 'owner')
+        customer = make_customer()
+        for _ in range(3):
+            make_order(customer, number_of_ties=2, total_amount=20000)
+
+    def queries(self, response):
+        return int(response['Server-Timing'].split('desc="')[1].split(' ')[0])
+
+    def test_middleware_stays_async(self):
+        async def view(request):
+            pass
+
+        for middleware in (instrumentation.RequestMetricsMiddleware, LastWriteMiddleware):
+            self.assertTrue(iscoroutinefunction(middleware(view)), middleware)
+            self.assertFalse(iscoroutinefunction(middleware(lambda request: None)), middleware)
+
+    def test_widget_queries_are_counted(self):
+        self.client.force_login(self.user)
+        self.async_client.cookies = self.client.cookies
+        sync_response = self.client.get('/dashboard/')
+        cache.clear()
+        async_response = async_to_sync(self.async_client.get)('/dashboard/async/')
+        self.assertEqual(async_response.status_code, 200)
+        self.assertEqual(async_response.context['unavailable_widgets'], [])
+        # The same widgets and session lookups, but run on the worker threads
+        self.assertEqual(self.queries(async_response), self.queries(sync_response))
+        self.assertEqual(
+            instrumentation.snapshot()['dashboard_async']['queries_p50'], self.queries(sync_response),
+        )
+
+
+class RequestMetricsTests(TestCase):
+    def test_server_timing_header_and_metrics_endpoint(self):
+        make_order(make_customer())
+        self.client.force_login(User.objects.create_superuser('owner', 'owner@example.com', 'owner'))
+        with mock.patch.dict(instrumentation._views, clear=True):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/orders/')
+            # Read now; the next request clears the connection's query log
+            query_count = len(queries)
+            self.assertRegex(
+                response['Server-Timing'], rf'^db;dur=\d+\.\d;desc="{query_count} queries", total;dur=\d+\.\d$',
+            )
+
+            metrics = self.client.get('/metrics/')
+        self.assertEqual(metrics['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        lines = metrics.content.decode().splitlines()
+        self.assertIn('# TYPE mytie_request_queries summary', lines)
+        self.assertIn(f'mytie_request_queries{{view="orders",quantile="0.5"}} {query_count}', lines)
+        self.assertIn('mytie_request_duration_seconds_count{view="orders"} 1', lines)
+
+
+class DashboardCacheStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_counters_are_shared_through_the_cache(self):
+        dashboard_metrics.get_metrics()
+        dashboard_metrics.get_metrics()
+        dashboard_metrics.invalidate([dashboard_metrics.COUNTS])
+        self.assertEqual(
+            dashboard_metrics.cache_stats(), {'hits': 4, 'misses': 4, 'invalidations': 1, 'hit_ratio': 0.5},
+        )
+        staff = User.objects.create_superuser('owner', 'owner@example.com', 'owner')
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get('/dashboard/cache-stats/').json()['misses'], 4)
+
+        # The figures live in the shared cache, not in this process
+        cache.clear()
+        self.assertEqual(dashboard_metrics.cache_stats()['misses'], 0)
+
+
+class DashboardReplicaCacheTests(SimpleTestCase):
+    # Not a TestCase: reads inside its transaction never go to the replica
+    def setUp(self):
+        cache.clear()
+
+    def test_replica_misses_after_an_invalidation_read_from_default(self):
+        def read_alias():
+            return router.db_for_read(Order) or DEFAULT_DB_ALIAS
+
+        with reading_from(REPLICA_ALIAS), mock.patch.object(dashboard_metrics, 'refreshed_at') as refreshed_at:
+            refreshed_at.return_value = time.time() - 60
+            self.assertEqual(dashboard_metrics.cached('widget', read_alias), REPLICA_ALIAS)
+            dashboard_metrics.invalidate(['widget'])
+            # The snapshot predates the write, so its figures must not be cached
+            self.assertEqual(dashboard_metrics.cached('widget', read_alias), DEFAULT_DB_ALIAS)
+            self.assertEqual(dashboard_metrics.cached('widget', read_alias), DEFAULT_DB_ALIAS)
+
+            dashboard_metrics.invalidate(['widget'])
+            refreshed_at.return_value = time.time() + 1
+            self.assertEqual(dashboard_metrics.cached('widget', read_alias), REPLICA_ALIAS)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer = make_customer(first_name='=HYPERLINK("http://example.com")', phone='+2348030000000')
+            make_order(self.customer, total_amount=10000, customer_delivery_amount=2000, delivery_fee=2000)
+
+    def export(self, write, params=None):
+        header, rows = exports.customer_rows(params or {})
+        output = io.BytesIO() if write is exports.write_xlsx else io.StringIO()
+        write(header, rows, output)
+        return output
+
+    def test_formula_like_text_is_escaped(self):
+        header, row = list(csv.reader(io.StringIO(self.export(exports.write_csv).getvalue())))
+        self.assertEqual(row[0], '\'=HYPERLINK("http://example.com")')
+        # Phone numbers and figures are not formulas and keep their value
+        self.assertEqual(row[2], '+2348030000000')
+
+        from openpyxl import load_workbook
+
+        sheet = load_workbook(self.export(exports.write_xlsx)).active
+        self.assertEqual(sheet['A2'].value, '=HYPERLINK("http://example.com")')
+        self.assertEqual((sheet['A2'].data_type, sheet['A2'].quotePrefix), ('s', True))
+        self.assertEqual(sheet['C2'].value, '+2348030000000')
+
+    def test_customer_totals_match_the_customer_pages(self):
+        header, row = list(csv.reader(io.StringIO(self.export(exports.write_csv).getvalue())))
+        values = dict(zip(header, row))
+        self.assertEqual(Decimal(values['Paid for ties']), self.customer.total_cost_of_ties())
+        self.assertEqual(Decimal(values['Lifetime value']), self.customer.total_amount_paid())
+        self.assertEqual(Decimal(values['Lifetime value']), Decimal('12000'))
+
+
+class SearchTests(TestCase):
+    def order_ids(self, query):
+        return {result['id'] for result in search.search(query, kind=search.ORDER)}
+
+    def test_orders_are_found_by_customer_name_after_a_rename(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            customer = make_customer(first_name='Ngozi', last_name='Okafor')
+            orders = {make_order(customer).pk, make_order(customer).pk}
+        self.assertEqual(self.order_ids('ngozi okafor'), orders)
+
+        customer = Customer.objects.get(pk=customer.pk)
+        customer.last_name = 'Balogun'
+        with self.captureOnCommitCallbacks(execute=True):
+            customer.save()
+        self.assertEqual(self.order_ids('okafor'), set())
+        self.assertEqual(self.order_ids('ngozi balogun'), orders)
+
+    def test_migration_fills_the_index_of_an_existing_database(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            customer = make_customer(first_name='Ngozi', last_name='Okafor')
+            order = make_order(customer)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.TABLE}')
+        migration = importlib.import_module('apps.core.migrations.0017_fill_search_index')
+        executor = MigrationExecutor(connection)
+        migration.fill_search_index(executor.loader.project_state(('core', '0017_fill_search_index')).apps,
+                                    connection.schema_editor())
+        self.assertEqual(self.order_ids('ngozi'), {order.pk})
+        self.assertEqual([result['id'] for result in search.search('okafor', kind=search.CUSTOMER)], [customer.pk])
+
+
+class BackupTests(SimpleTestCase):
+    def test_backups_in_the_same_second_are_kept_apart_and_pruned(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source = Path(directory) / 'source.sqlite3'
+            with sqlite3.connect(source) as db:
+                db.execute('CREATE TABLE t (x)')
+            output_dir = Path(directory) / 'backups'
+            written = []
+            with mock.patch.dict(settings.DATABASES['default'], NAME=str(source)):
+                for _ in range(3):
+                    call_command('backup_db', output_dir=output_dir, keep=2, quick=True, stdout=io.StringIO())
+                    written.append(max(output_dir.iterdir()).name)
+            self.assertEqual(len(set(written)), 3)
+            self.assertEqual(sorted(path.name for path in output_dir.iterdir()), written[1:])
+
+
+class ProductImageTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.media = Path(directory.name)
+        self.enterContext(self.settings(MEDIA_ROOT=directory.name, PRODUCT_IMAGES_IN_BACKGROUND=False))
+
+    def png(self, size=(200, 100)):
+        output = io.BytesIO()
+        Image.new('RGBA', size, 'navy').save(output, format='PNG')
+        return output.getvalue()
+
+    def upload(self, sku, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(sku=sku, image=SimpleUploadedFile('tie.png', content))
+        product.refresh_from_db()
+        return product
+
+    def stored(self):
+        return sorted(str(path.relative_to(self.media)) for path in self.media.rglob('*') if path.is_file())
+
+    def test_upload_is_renamed_by_content_and_thumbnailed(self):
+        content = self.png()
+        digest = hashlib.sha256(content).hexdigest()
+        product = self.upload('TIE-1', content)
+        self.assertEqual(product.image.name, f'ties/{digest}.png')
+        self.assertEqual((product.image_variants['width'], product.image_variants['height']), (200, 100))
+        # Thumbnails are never wider than the image
+        self.assertEqual(
+            product.image_variants['thumbnails']['medium'],
+            {'jpeg': f'ties/thumbs/{digest}-200.jpg', 'webp': f'ties/thumbs/{digest}-200.webp'},
+        )
+        self.assertEqual(self.stored(), [
+            f'ties/{digest}.png',
+            f'ties/thumbs/{digest}-160.jpg', f'ties/thumbs/{digest}-160.webp',
+            f'ties/thumbs/{digest}-200.jpg', f'ties/thumbs/{digest}-200.webp',
+        ])
+        with Image.open(self.media / f'ties/thumbs/{digest}-160.jpg') as thumbnail:
+            self.assertEqual(thumbnail.size, (160, 80))
+
+    def test_identical_uploads_share_files(self):
+        first = self.upload('TIE-1', self.png())
+        stored = self.stored()
+        second = self.upload('TIE-2', self.png())
+        self.assertEqual(second.image_variants, first.image_variants)
+        self.assertEqual(self.stored(), stored)
+
+    def test_the_name_the_storage_chose_is_recorded(self):
+        self.upload('TIE-1', self.png())
+        exists, checked = default_storage.exists, set()
+
+        def exists_after_the_check(name):
+            # As if another process saved the file between the check and the save
+            if name in checked:
+                return exists(name)
+            checked.add(name)
+            return False
+
+        with mock.patch.object(default_storage, 'exists', side_effect=exists_after_the_check):
+            product = self.upload('TIE-2', self.png())
+        for name in [product.image.name, *product.image_variants['thumbnails']['small'].values()]:
+            self.assertTrue((self.media / name).is_file(), name)
+        self.assertNotEqual(product.image.name, Product.objects.get(sku='TIE-1').image.name)
+
+    def test_corrupt_and_oversized_images_do_not_stop_the_backfill(self):
+        # Saved without running the on-commit processing, as before a backfill
+        corrupt = Product.objects.create(sku='TIE-1', image=SimpleUploadedFile('bad.png', b'not an image'))
+        good = Product.objects.create(sku='TIE-2', image=SimpleUploadedFile('tie.png', self.png((50, 50))))
+        huge = Product.objects.create(sku='TIE-3', image=SimpleUploadedFile('huge.png', self.png()))
+        out, err = io.StringIO(), io.StringIO()
+        # Twice this many pixels raises DecompressionBombError, which is not an OSError
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 5000):
+            call_command('process_product_images', stdout=out, stderr=err)
+        self.assertIn('Processed 1 product images', out.getvalue())
+        self.assertIn('2 failed', out.getvalue())
+        self.assertIn('TIE-1', err.getvalue())
+        self.assertIn('TIE-3', err.getvalue())
+        self.assertTrue(images.needs_processing(Product.objects.get(pk=corrupt.pk)))
+        self.assertFalse(images.needs_processing(Product.objects.get(pk=good.pk)))
+        self.assertTrue(images.needs_processing(Product.objects.get(pk=huge.pk)))
+
+
+class BackfillDailySummaryTests(TestCase):
+    def test_backfill_repairs_the_summary_in_batches(self):
+        customer = make_customer()
+        with self.captureOnCommitCallbacks(execute=True):
+            for days_ago in range(3):
+                make_order(customer, number_of_ties=2, total_amount=10000,
+                           created_at=timezone.now() - timedelta(days=days_ago))
+        OrderDailySummary.objects.all().delete()
+        out = io.StringIO()
+        call_command('backfill_daily_summary', batch_days=2, stdout=out)
+        self.assertIn('Summarized 3 days (3 with orders)', out.getvalue())
+        self.assertEqual(OrderDailySummary.objects.totals()['ties_sold'], 6)
+
+    def test_batch_days_must_be_positive(self):
+        for batch_days in (0, -1):
+            with self.assertRaisesMessage(CommandError, '--batch-days must be at least 1'):
+                call_command('backfill_daily_summary', batch_days=batch_days, stdout=io.StringIO())
+
+
+class CustomerLookupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        make_customer(first_name='Ada', last_name='Obi')
+        make_customer(first_name='ADAEZE', last_name='Okoro', phone='08031111111')
+        self.client.force_login(User.objects.create_user('clerk', password='clerk'))
+
+    def names(self, query):
+        response = self.client.get('/customers/lookup/', {'q': query})
+        return [result['name'] for result in response.json()['results']]
+
+    def test_queries_differing_only_in_case_are_cached_apart(self):
+        self.assertEqual(self.names('Ada'), ['Ada Obi'])
+        self.assertEqual(self.names('ADA'), ['ADAEZE Okoro', 'Ada Obi'])
+        self.assertEqual(self.names('ada'), ['Ada Obi'])
+        self.assertEqual(self.names('Ada'), ['Ada Obi'])
+        self.assertEqual(self.names('0803 111'), ['ADAEZE Okoro'])
@@ -5,14 +5,30 @@ from . import views
 urlpatterns = [
     path('', lambda request: redirect('dashboard')),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/async/', views.dashboard_async, name='dashboard_async'),
+    path('dashboard/cache-stats/', views.dashboard_cache_stats, name='dashboard_cache_stats'),
+    path('metrics/', views.request_metrics, name='request_metrics'),
     path('customers/', views.customers, name='customers'),
+    path('customers/lookup/', views.customer_lookup, name='customer_lookup'),
     path('orders/', views.orders, name='orders'),
     path('orders/edit/<int:order_id>/', views.edit_order, name='edit_order'),
     path('orders/update/', views.update_order, name='update_order'),
     path('orders/delete/<int:order_id>/', views.delete_order, name='delete_order'),
+    path('orders/bulk/', views.bulk_orders, name='bulk_orders'),
     path('customers/<int:customer_id>/orders/', views.customer_orders, name='customer_orders'),
+    path('customers/<int:customer_id>/orders/page/', views.customer_orders_page, name='customer_orders_page'),
     path('financial-report/', views.financial_report, name='financial_report'),
+    path('financial-report/data/', views.financial_report_data, name='financial_report_data'),
+    path('analytics/', views.analytics_report, name='analytics_report'),
+    path('analytics/data/', views.analytics_data, name='analytics_data'),
+    path('analytics/cohorts/', views.cohort_report, name='cohort_report'),
+    path('export/<slug:dataset>.<slug:file_format>', views.export_data, name='export_data'),
+    path('search/', views.search_results, name='search'),
+    path('api/search/', views.search_api, name='search_api'),
+    path('api/<slug:resource>/', views.api_list, name='api_list'),
+    path('expenses/', views.expense_ledger, name='expense_ledger'),
     path('expenses/edit/<int:expense_id>/', views.edit_expense, name='edit_expense'),
     path('expenses/update/', views.update_expense, name='update_expense'),
     path('expenses/delete/<int:expense_id>/', views.delete_expense, name='delete_expense'),
+    path('expenses/suggest/', views.expense_suggestions, name='expense_suggestions'),
 ]
\ No newline at end of file
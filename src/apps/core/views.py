@@ -1,61 +1,57 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.db.models import Q, Sum
+from django.core.cache import cache
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.db.models import F, Q
 from django.utils import timezone
-from datetime import datetime
+from datetime import datetime, timedelta
 from decimal import Decimal
-from .models import Product, Customer, Order, OrderItem, Expense
+import hashlib
+from . import analytics, api, bulk, dashboard_metrics, exports, instrumentation, reports, search
+from .models import Product, Customer, Order, OrderItem, Expense, ExpenseTerm
+from .pagination import KeysetPaginator
+from .replica import reads_from_replica, replica_for
 from .forms import OrderCreateForm, ExpenseForm
 
+CUSTOMER_LOOKUP_LIMIT = 10
+CUSTOMER_LOOKUP_CACHE_TIMEOUT = 30  # seconds
+
 @login_required
+@reads_from_replica
 def dashboard(request):
-    from django.utils import timezone
-    from datetime import timedelta
-    
-    # Basic metrics
-    total_customers = Customer.objects.count()
-    total_orders = Order.objects.count()
-    total_ties_sold = sum(order.number_of_ties for order in Order.objects.all())
-    
-    # Recent activity
-    recent_orders = Order.objects.select_related('customer').order_by('-created_at')[:5]
-    
-    # Current month revenue
-    today = timezone.now().date()
-    month_start = today.replace(day=1)
-    month_orders = Order.objects.filter(created_at__date__gte=month_start)
-    current_month_revenue = sum(order.total_amount for order in month_orders)
-    current_month = month_start.strftime('%b %Y')
-    
-
-    
-    # Top customers
-    customers = Customer.objects.all()
-    top_customers = sorted(customers, key=lambda c: c.customer_lifetime_value(), reverse=True)[:5]
-    
-    # Alerts
-    alerts = []
-    
-    context = {
-        'total_customers': total_customers,
-        'total_orders': total_orders,
-        'total_ties_sold': total_ties_sold,
-        'recent_orders': recent_orders,
-        'current_month_revenue': current_month_revenue,
-        'current_month': current_month,
-
-        'top_customers': top_customers,
-        'alerts': alerts,
-    }
+    context = dashboard_metrics.get_metrics()
+    context['alerts'] = []
     return render(request, 'core/dashboard.html', context)
 
+async def dashboard_async(request):
+    """The dashboard with its widgets loaded concurrently; only faster when served over ASGI."""
+    # login_required and reads_from_replica only wrap sync views in Django 4.2
+    if not await sync_to_async(lambda: request.user.is_authenticated)():
+        return redirect_to_login(request.get_full_path())
+    context = await dashboard_metrics.get_metrics_async(replica_for(request))
+    context['alerts'] = []
+    return await sync_to_async(render)(request, 'core/dashboard.html', context)
+
+@staff_member_required
+def dashboard_cache_stats(request):
+    return JsonResponse(dashboard_metrics.cache_stats())
+
+@staff_member_required
+def request_metrics(request):
+    return HttpResponse(instrumentation.prometheus_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @login_required
 def customers(request):
     sort_by = request.GET.get('sort', 'name')
     search_query = request.GET.get('search', '')
     
-    customers = Customer.objects.all()
+    customers = Customer.objects.with_order_stats()
     
     # Search functionality
     if search_query:
@@ -66,21 +62,19 @@ def customers(request):
             Q(email__icontains=search_query)
         )
     
+    # Sort in the database so pagination only fetches the current page
+    if sort_by == 'first_order':
+        customers = customers.order_by(F('first_order_at').desc(nulls_last=True), 'pk')
+    elif sort_by == 'ties':
+        customers = customers.order_by('-ties_bought', 'pk')
+    else:  # alphabetical
+        customers = customers.order_by('first_name', 'last_name', 'pk')
+    
     # Pagination
     from django.core.paginator import Paginator
     paginator = Paginator(customers, 20)
     page_number = request.GET.get('page')
     
-    if sort_by == 'first_order':
-        customers_list = sorted(customers, key=lambda c: c.first_order_date() or datetime.min.replace(tzinfo=timezone.utc), reverse=True)
-        paginator = Paginator(customers_list, 20)
-    elif sort_by == 'ties':
-        customers_list = sorted(customers, key=lambda c: c.total_ties_bought(), reverse=True)
-        paginator = Paginator(customers_list, 20)
-    else:  # alphabetical
-        customers = customers.order_by('first_name', 'last_name')
-        paginator = Paginator(customers, 20)
-    
     page_obj = paginator.get_page(page_number)
     
     return render(request, 'core/customers.html', {
@@ -136,7 +130,6 @@ def orders(request):
                 cost_price_per_tie=cost_price_per_tie,
                 total_amount=Decimal(str(request.POST.get('total_cost_of_ties'))),
                 total_cost=total_cost,
-                gross_profit=0,  # Will be calculated by calculate_profit method
                 delivery_fee=total_delivery_fee,
                 delivery_payment_type=request.POST.get('delivery_payment_type'),
                 customer_delivery_amount=customer_delivery,
@@ -152,53 +145,123 @@ def orders(request):
     
     form = OrderCreateForm()
     
-    orders = Order.objects.all().order_by('-created_at')
-    customers = Customer.objects.all()
+    filters = _order_filters(request)
+    orders = reports.filtered_orders(**filters).select_related('customer')
     
-    # Pagination
-    from django.core.paginator import Paginator
-    paginator = Paginator(orders, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination on (created_at, id): deep pages cost the same as the first
+    paginator = KeysetPaginator(orders, ('created_at', 'id'), per_page=20)
+    page_obj = paginator.get_page(after=request.GET.get('after'), before=request.GET.get('before'))
+    
+    # Cursor links keep the current filters
+    query = request.GET.copy()
+    for param in ('after', 'before'):
+        query.pop(param, None)
     
     return render(request, 'core/orders.html', {
         'orders': page_obj,
-        'customers': customers, 
         'form': form,
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        'total_count': paginator.count() if request.GET.get('count') else None,
+        'filter_query': query.urlencode(),
+        'status_choices': Order.STATUS_CHOICES,
+        'transition_choices': [choice for choice in Order.STATUS_CHOICES if choice[0] in Order.STATUS_TRANSITIONS],
+        'delivery_choices': Order.DELIVERY_CHOICES,
+        **filters,
     })
 
+def _order_filters(request):
+    return {
+        'start': reports.parse_date(request.GET.get('start')),
+        'end': reports.parse_date(request.GET.get('end')),
+        'status': request.GET.get('status') or None,
+        'delivery_type': request.GET.get('delivery_type') or None,
+    }
+
+def _prefix(field, value):
+    # A range rather than LIKE 'x%' so SQLite can use the plain B-tree index
+    return Q(**{f'{field}__gte': value, f'{field}__lt': value + '\U0010ffff'})
+
 @login_required
+def customer_lookup(request):
+    query = ' '.join(request.GET.get('q', '').split())
+    if len(query) < 2:
+        return JsonResponse({'results': []})
+    
+    phone = query.replace(' ', '')
+    if phone.lstrip('+').isdigit():
+        variants = ('phone', phone)
+    else:
+        # Names are usually stored capitalised, so also try the title-cased prefix
+        variants = ('name', *sorted({query, query.title()}))
+    # The prefix lookups are case-sensitive, so the key is built from exactly what is matched
+    cache_key = 'customer_lookup:' + hashlib.md5('\0'.join(variants).encode()).hexdigest()
+    results = cache.get(cache_key)
+    if results is None:
+        if variants[0] == 'phone':
+            condition = _prefix('phone', phone)
+        else:
+            condition = Q()
+            for variant in variants[1:]:
+                first, _, last = variant.partition(' ')
+                if last:
+                    condition |= Q(first_name=first) & _prefix('last_name', last)
+                else:
+                    condition |= _prefix('first_name', first)
+        customers = Customer.objects.filter(condition).order_by('first_name', 'last_name')[:CUSTOMER_LOOKUP_LIMIT]
+        results = [
+            {
+                'id': customer.id,
+                'name': f'{customer.first_name} {customer.last_name}'.strip(),
+                'phone': customer.phone,
+                'address': customer.address,
+            }
+            for customer in customers.only('first_name', 'last_name', 'phone', 'address')
+        ]
+        cache.set(cache_key, results, CUSTOMER_LOOKUP_CACHE_TIMEOUT)
+    return JsonResponse({'results': results})
+
+@login_required
+@reads_from_replica
 def customer_orders(request, customer_id):
-    customer = get_object_or_404(Customer, id=customer_id)
-    orders = Order.objects.filter(customer=customer)
+    # The header figures come from the customer's stats row, joined in this one query
+    customer = get_object_or_404(Customer.objects.select_related('stats'), id=customer_id)
+    orders = _customer_order_history(customer_id, request.GET.get('after'))
     return render(request, 'core/customer_orders.html', {'customer': customer, 'orders': orders})
 
 @login_required
+@reads_from_replica
+def customer_orders_page(request, customer_id):
+    """The next page of a customer's order history as rendered rows, for infinite scroll."""
+    orders = _customer_order_history(customer_id, request.GET.get('after'))
+    return JsonResponse({
+        'html': render_to_string('core/customer_order_rows.html', {'orders': orders}, request=request),
+        'next_cursor': orders.next_cursor,
+    })
+
+def _customer_order_history(customer_id, after):
+    orders = Order.objects.filter(customer_id=customer_id).only(
+        'id', 'order_number', 'created_at', 'status', 'total_amount', 'net_profit',
+    )
+    return KeysetPaginator(orders, ('created_at', 'id'), per_page=50).get_page(after=after)
+
+@login_required
+@reads_from_replica
 def financial_report(request):
     if request.method == 'POST':
         form = ExpenseForm(request.POST)
         if form.is_valid():
             expense = form.save(commit=False)
             
-            # Handle expense type (existing or custom)
-            expense_type = request.POST.get('expense_type')
-            if expense_type == '__new__':
-                expense.expense_type = request.POST.get('custom_expense_type')
-            else:
-                expense.expense_type = expense_type
-            
             # Handle date field
             date_str = request.POST.get('date')
             if date_str:
                 from datetime import datetime
                 try:
-                    expense.date = datetime.strptime(date_str, '%d/%m/%Y')
+                    expense.date = timezone.make_aware(datetime.strptime(date_str, '%d/%m/%Y'))
                 except ValueError:
-                    expense.date = datetime.strptime(date_str, '%Y-%m-%d')
+                    expense.date = timezone.make_aware(datetime.strptime(date_str, '%Y-%m-%d'))
             else:
                 # Default to today if no date provided
-                from django.utils import timezone
                 expense.date = timezone.now()
             expense.save()
             messages.success(request, 'Expense added successfully!')
@@ -206,48 +269,147 @@ def financial_report(request):
     else:
         form = ExpenseForm()
     
-    # Get all data
-    customers = Customer.objects.all()
-    orders = Order.objects.all()
-    expenses = Expense.objects.all()
-    
-    # Calculate total revenue as total income from sales
-    total_revenue = sum(order.total_amount for order in orders)
-    
-    # Calculate expenses
-    general_expenses = expenses.filter(order__isnull=True).aggregate(Sum('amount'))['amount__sum'] or 0
-    order_expenses = expenses.filter(order__isnull=False).aggregate(Sum('amount'))['amount__sum'] or 0
-    business_delivery = sum(order.business_delivery_amount for order in orders)
-    packaging_expenses = expenses.filter(expense_type='packaging').aggregate(Sum('amount'))['amount__sum'] or 0
-    
-    total_expenses = general_expenses + order_expenses + business_delivery + packaging_expenses
-    
-    # Get existing expense descriptions and types for autocomplete
-    expense_descriptions = list(expenses.values_list('description', flat=True).distinct())
-    existing_expense_types = list(expenses.values_list('expense_type', flat=True).distinct())
+    filters = _report_filters(request)
     
+    # Expense types and descriptions are suggested by expense_suggestions as the user types
     context = {
         'form': form,
-        'total_revenue': total_revenue,
-        'total_expenses': total_expenses,
-        'net_profit': total_revenue - total_expenses,
-        'net_margin': ((total_revenue - total_expenses) / total_revenue * 100) if total_revenue > 0 else 0,
-        'expenses_percentage': (total_expenses / total_revenue * 100) if total_revenue > 0 else 0,
-        'order_count': orders.count(),
-        'general_expenses': general_expenses,
-        'order_expenses': order_expenses,
-        'business_delivery': business_delivery,
-        'packaging_expenses': packaging_expenses,
-        'expense_descriptions': expense_descriptions,
-        'existing_expense_types': existing_expense_types,
-        'recent_expenses': expenses.order_by('-date')[:10],
+        **reports.financial_summary(**filters),
+        'recent_expenses': reports.filtered_expenses(**filters).order_by('-date')[:10],
     }
     
     return render(request, 'core/financial_report.html', context)
 
+@login_required
+@reads_from_replica
+def expense_ledger(request):
+    filters = _report_filters(request)
+    paginator = KeysetPaginator(reports.filtered_expenses(**filters).select_related('order'), ('date', 'id'), per_page=50)
+    page_obj = paginator.get_page(after=request.GET.get('after'), before=request.GET.get('before'))
+    
+    # Cursor links keep the current filters
+    query = request.GET.copy()
+    for param in ('after', 'before'):
+        query.pop(param, None)
+    
+    return render(request, 'core/expense_ledger.html', {
+        'expenses': page_obj,
+        'page_obj': page_obj,
+        'total_count': paginator.count() if request.GET.get('count') else None,
+        'filter_query': query.urlencode(),
+        **filters,
+    })
+
+@login_required
+@reads_from_replica
+def export_data(request, dataset, file_format):
+    import tempfile
+    if dataset not in exports.DATASETS or file_format not in exports.FORMATS:
+        raise Http404('Unknown export')
+    header, rows = exports.DATASETS[dataset](request.GET)
+    filename = exports.filename(dataset, file_format)
+    
+    if file_format == exports.CSV:
+        response = StreamingHttpResponse(exports.csv_lines(header, rows), content_type=exports.FORMATS[exports.CSV])
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    
+    # An XLSX file is a zip archive, so it is built on disk and then streamed
+    output = tempfile.TemporaryFile()
+    exports.write_xlsx(header, rows, output, title=dataset)
+    output.seek(0)
+    return FileResponse(output, as_attachment=True, filename=filename, content_type=exports.FORMATS[exports.XLSX])
+
+@login_required
+def search_results(request):
+    query = request.GET.get('q', '')
+    kind = request.GET.get('kind') if request.GET.get('kind') in search.DOCUMENTS else None
+    return render(request, 'core/search.html', {
+        'query': query,
+        'kind': kind,
+        'results': search.search(query, kind=kind, limit=50),
+    })
+
+@login_required
+def search_api(request):
+    kind = request.GET.get('kind') if request.GET.get('kind') in search.DOCUMENTS else None
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 100)
+    except ValueError:
+        limit = 20
+    return JsonResponse({'results': search.search(request.GET.get('q', ''), kind=kind, limit=limit)})
+
+@login_required
+@reads_from_replica
+def api_list(request, resource):
+    if resource not in api.RESOURCES:
+        raise Http404('Unknown resource')
+    try:
+        return JsonResponse(api.fetch(resource, request.GET))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+def _report_filters(request):
+    return {
+        'start': reports.parse_date(request.GET.get('start')),
+        'end': reports.parse_date(request.GET.get('end')),
+        'expense_type': request.GET.get('expense_type') or None,
+    }
+
+@login_required
+@reads_from_replica
+def financial_report_data(request):
+    return JsonResponse(reports.financial_summary(**_report_filters(request)))
+
+def _analytics_series(request):
+    """The granularity, series and totals for the analytics filters in the query string."""
+    granularity = request.GET.get('granularity') or 'month'
+    end = reports.parse_date(request.GET.get('end')) or timezone.localdate()
+    start = reports.parse_date(request.GET.get('start')) or end - timedelta(days=analytics.DEFAULT_SPANS.get(granularity, 0))
+    periods = analytics.series(granularity, start, end)
+    totals = {field: sum(period[field] for period in periods) for field in analytics.FIELDS}
+    return granularity, periods, totals
+
+@login_required
+def analytics_report(request):
+    try:
+        granularity, periods, totals = _analytics_series(request)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('analytics_report')
+    return render(request, 'core/analytics.html', {
+        'granularity': granularity,
+        'granularities': list(analytics.GRANULARITIES),
+        'start': periods[0]['period'],
+        'end': analytics.next_period(periods[-1]['period'], granularity) - timedelta(days=1),
+        'periods': periods,
+        'totals': totals,
+        'chart': {
+            'labels': [period['period'].isoformat() for period in periods],
+            **{field: [float(period[field]) for period in periods] for field in ('revenue', 'gross_profit', 'net_profit', 'expenses')},
+        },
+    })
+
+@login_required
+@reads_from_replica
+def cohort_report(request):
+    this_month = timezone.localdate().replace(day=1)
+    start = reports.parse_date(request.GET.get('start')) or this_month.replace(year=this_month.year - 1)
+    end = reports.parse_date(request.GET.get('end'))
+    context = reports.cohort_matrix(start, end)
+    context.update(start=start, end=end)
+    return render(request, 'core/cohorts.html', context)
+
+@login_required
+def analytics_data(request):
+    try:
+        granularity, periods, totals = _analytics_series(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'granularity': granularity, 'periods': periods, 'totals': totals})
+
 @login_required
 def edit_order(request, order_id):
-    from django.http import JsonResponse
     order = get_object_or_404(Order, id=order_id)
     
     data = {
@@ -309,7 +471,6 @@ def update_order(request):
             order.cost_price_per_tie = cost_price_per_tie
             order.total_amount = Decimal(str(request.POST.get('total_cost_of_ties')))
             order.total_cost = total_cost
-            order.gross_profit = 0  # Will be calculated by calculate_profit method
             order.delivery_fee = total_delivery_fee
             order.delivery_payment_type = request.POST.get('delivery_payment_type')
             order.customer_delivery_amount = customer_delivery
@@ -336,9 +497,42 @@ def delete_order(request, order_id):
             messages.error(request, f'Error deleting order: {str(e)}')
     return redirect('orders')
 
+@login_required
+def bulk_orders(request):
+    # The orders page posts here with its filters in the query string
+    back = f"{reverse('orders')}?{request.GET.urlencode()}"
+    if request.method != 'POST':
+        return redirect(back)
+    if request.POST.get('scope') == 'filter':
+        orders = reports.filtered_orders(**_order_filters(request))
+    else:
+        ids = [int(pk) for pk in request.POST.getlist('order_ids') if pk.isdigit()]
+        if not ids:
+            messages.error(request, 'No orders selected.')
+            return redirect(back)
+        orders = Order.objects.filter(pk__in=ids)
+    
+    action = request.POST.get('action')
+    try:
+        if action == 'delete':
+            deleted = bulk.delete(orders)
+            messages.success(request, f'Deleted {deleted} order(s).')
+        elif action == 'status':
+            status = request.POST.get('status')
+            updated, skipped = bulk.transition(orders, status)
+            label = dict(Order.STATUS_CHOICES).get(status, status)
+            message = f'Moved {updated} order(s) to {label}.'
+            if skipped:
+                message += f' {skipped} order(s) were skipped because their status cannot change to {label}.'
+            messages.success(request, message)
+        else:
+            messages.error(request, 'Unknown bulk action.')
+    except ValueError as e:
+        messages.error(request, str(e))
+    return redirect(back)
+
 @login_required
 def edit_expense(request, expense_id):
-    from django.http import JsonResponse
     expense = get_object_or_404(Expense, id=expense_id)
     
     data = {
@@ -361,14 +555,7 @@ def update_expense(request):
             expense = get_object_or_404(Expense, id=expense_id)
             
             expense.amount = Decimal(str(request.POST.get('amount')))
-            
-            # Handle expense type (existing or custom)
-            expense_type = request.POST.get('expense_type')
-            if expense_type == '__new__':
-                expense.expense_type = request.POST.get('custom_expense_type')
-            else:
-                expense.expense_type = expense_type
-                
+            expense.expense_type = request.POST.get('expense_type')
             expense.description = request.POST.get('description')
             
             # Handle date field if provided
@@ -376,9 +563,9 @@ def update_expense(request):
             if date_str:
                 from datetime import datetime
                 try:
-                    expense.date = datetime.strptime(date_str, '%d/%m/%Y')
+                    expense.date = timezone.make_aware(datetime.strptime(date_str, '%d/%m/%Y'))
                 except ValueError:
-                    expense.date = datetime.strptime(date_str, '%Y-%m-%d')
+                    expense.date = timezone.make_aware(datetime.strptime(date_str, '%Y-%m-%d'))
             
             expense.save()
             messages.success(request, 'Expense updated successfully!')
@@ -387,6 +574,17 @@ def update_expense(request):
     
     return redirect('financial_report')
 
+@login_required
+def expense_suggestions(request):
+    kind = request.GET.get('kind') or ExpenseTerm.TYPE
+    if kind not in ExpenseTerm.SOURCES:
+        return JsonResponse({'error': f"kind must be one of {', '.join(ExpenseTerm.SOURCES)}"}, status=400)
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    return JsonResponse({'results': ExpenseTerm.suggest(kind, request.GET.get('q', ''), limit)})
+
 @login_required
 def delete_expense(request, expense_id):
     if request.method == 'POST':
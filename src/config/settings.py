@@ -48,12 +48,14 @@ AXES_LOCKOUT_TEMPLATE = 'registration/locked_out.html'
 AXES_RESET_ON_SUCCESS = True
 
 MIDDLEWARE = [
+    'apps.core.instrumentation.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'apps.core.replica.LastWriteMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -85,9 +87,38 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+    },
+    # Read-only snapshot for the reporting pages, refreshed by `manage.py refresh_replica`
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f"file:{BASE_DIR / 'db_replica.sqlite3'}?mode=ro",
+        'OPTIONS': {'uri': True},
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = ['apps.core.replica.ReplicaRouter']
+REPLICA_MAX_STALENESS = 300  # seconds; older snapshots are ignored
+BACKUP_DIR = BASE_DIR / 'backups'
+BACKUP_KEEP = 14  # backups kept by backup_db, oldest are deleted first
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# File based so that invalidations reach every gunicorn worker
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
     }
 }
 
+DASHBOARD_CACHE_TIMEOUT = 300  # seconds
+DASHBOARD_WIDGET_WORKERS = 4  # threads loading widgets concurrently on /dashboard/async/
+DASHBOARD_WIDGET_TIMEOUTS = {}  # per-widget seconds, e.g. {'top_customers': 1.0}; unset widgets get 2s
+REQUEST_METRICS_WINDOW = 1000  # recent requests per view used for the latency percentiles
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -128,6 +159,7 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+PRODUCT_IMAGES_IN_BACKGROUND = True  # make thumbnails on a worker thread after the upload commits
 
 # Login/Logout URLs
 LOGIN_URL = '/login/'